@@ -7,76 +7,92 @@ if workspace_root not in sys.path:
 
 import random
 import math
-from tools.geometric import lines_are_overlap, point_to_line_dist
+from tools.geometric import segment_point_dist, segments_overlap, SegmentGrid, poisson_disk_sample
+from tools.segment_array import SegmentArray
 from tools.segment_presentation import present_segments
 
 class AnyBuilding():
     def __init__(self, width, height,segments: list = None):
         self.width = width
         self.height = height
-        # Avoid using a mutable default argument. Create a fresh list per instance.
-        self.segments = list(segments) if segments is not None else []
-        self.frame_segments = []
+        # Walls are kept in a SegmentArray, the frame walls are flagged.
+        self.segments = segments if segments is not None else []
+        self._grid = None
 
-    def create_random_building(self, num_of_segments):
+    @property
+    def segments(self):
+        return self._segments
+
+    @segments.setter
+    def segments(self, segments):
+        # a plain list of walls is wrapped, with the walls along the frame flagged
+        if not isinstance(segments, SegmentArray):
+            segments = list(segments)
+            segments = SegmentArray(segments, [self._wall_flags(seg) for seg in segments])
+        self._segments = segments
+
+    def _wall_flags(self, seg):
+        (x1, y1), (x2, y2) = seg
+        if x1 == x2 in (0, self.width) or y1 == y2 in (0, self.height):
+            return SegmentArray.FRAME
+        return 0
+
+    @property
+    def frame_segments(self):
+        return self.segments.select(SegmentArray.FRAME)
+
+    def create_random_building(self, num_of_segments, max_attempts=None):
         self.add_frame()
         points = self.add_random_points(num_of_segments)
-        self.add_random_segments(num_of_segments, points)
+        self.add_random_segments(num_of_segments, points, max_attempts)
     
-    def add_random_points(self, num_of_segments, min_dist=1):
-        points = []
-        while len(points) < num_of_segments*1.25:
-            if random.random() < 0 and len(points) >= 2:
-                # create a point on an existing line
-                p1, p2 = random.sample(points, k=2)
-                x1,y1 = p1[0], p1[1]
-                x2,y2 = p2[0], p2[1]
-                t = random.random()
-                x = x1 + (x2 - x1) * t
-                y = y1 + (y2 - y1) * t
-            else:
-                x = random.uniform(0, self.width)
-                y = random.uniform(0, self.height)
-            point_too_close = False
-            for p in points:
-                if math.sqrt((p[0] - x)**2 + (p[1]-y)**2) < min_dist:
-                    point_too_close = True
-            if point_too_close:
-                continue
-            else:
-                points.append((x,y))
-        return points
+    def add_random_points(self, num_of_segments, min_dist=1, rng=None):
+        """
+        Random points for the walls, at least min_dist apart (see
+        poisson_disk_sample, which raises ValueError if they do not fit).
+        rng: random.Random like object, defaults to the random module
+        """
+        return poisson_disk_sample(self.width, self.height, min_dist, math.ceil(num_of_segments*1.25), rng)
 
     def seg_legal_check(self, new_segment, min_dist):
         # check if segment is not too close to another segment, or overlaps
-        for seg in self.segments:
-            if ((point_to_line_dist(seg[0], new_segment) < min_dist
-                and point_to_line_dist(seg[0], new_segment) != 0)
-                or (point_to_line_dist(seg[1], new_segment) < min_dist 
-                and point_to_line_dist(seg[1], new_segment) != 0)
-                or (point_to_line_dist(new_segment[0], seg) < min_dist 
-                and point_to_line_dist(new_segment[0], seg) != 0)
-                or (point_to_line_dist(new_segment[1], seg) < min_dist
-                and point_to_line_dist(new_segment[1], seg) != 0)
-                or lines_are_overlap(seg, new_segment)):
+        # the grid is kept between checks, so only the new walls are indexed
+        cell_size = max(min_dist, max(self.width, self.height) / 64)
+        if self._grid is None or self._grid.cell_size != cell_size:
+            self._grid = SegmentGrid(cell_size)
+        for seg in self._grid.sync(self.segments).query(new_segment, min_dist):
+            if ((segment_point_dist(seg[0], new_segment) < min_dist
+                and segment_point_dist(seg[0], new_segment) != 0)
+                or (segment_point_dist(seg[1], new_segment) < min_dist 
+                and segment_point_dist(seg[1], new_segment) != 0)
+                or (segment_point_dist(new_segment[0], seg) < min_dist 
+                and segment_point_dist(new_segment[0], seg) != 0)
+                or (segment_point_dist(new_segment[1], seg) < min_dist
+                and segment_point_dist(new_segment[1], seg) != 0)
+                or segments_overlap(seg, new_segment)):
                     return False
         return True
     
-    def add_random_segments(self, num_of_segments, points):
+    def add_random_segments(self, num_of_segments, points, max_attempts=None):
+        """
+        max_attempts: number of point pairs to try before giving up with a
+            ValueError, by default it keeps trying, which never ends when no
+            legal pair is left
+        """
+        attempts = 0
         while len(self.segments) < num_of_segments:
+            if max_attempts is not None and attempts >= max_attempts:
+                raise ValueError(f"Only {len(self.segments)} of {num_of_segments} segments placed in {max_attempts} attempts")
+            attempts += 1
             p1,p2 = random.sample(points, k=2)
             if self.seg_legal_check([p1,p2], 1):
                 self.segments.append([p1,p2])
 
     def add_frame(self):
-        self.segments.append([(0,0), (self.width, 0)])
-        self.frame_segments.append([(0,0), (self.width, 0)])
-        self.segments.append([(self.width, 0), (self.width, self.height)])
-        self.frame_segments.append([(self.width, 0), (self.width, self.height)])
-        self.segments.append([(self.width, self.height), (0,self.height)])
-        self.frame_segments.append([(self.width, self.height), (0,self.height)])
-        self.segments.append([(0,self.height), (0,0)])
-        self.frame_segments.append([(0,self.height), (0,0)])
+        self.segments.append([(0,0), (self.width, 0)], SegmentArray.FRAME)
+        self.segments.append([(self.width, 0), (self.width, self.height)], SegmentArray.FRAME)
+        self.segments.append([(self.width, self.height), (0,self.height)], SegmentArray.FRAME)
+        self.segments.append([(0,self.height), (0,0)], SegmentArray.FRAME)
 
 
 if __name__ == '__main__':
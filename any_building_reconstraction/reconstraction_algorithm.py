@@ -1,11 +1,13 @@
-from multiprocessing import Pool
 from any_building import AnyBuilding
 from tools.confirm_dist_calculation import calculate_dist
 from tools.segment_presentation import present_segments
-from tools.k_visibility import count_crossings
-from tools.geometric import center_of_three_parallel_pairs, combine_close_points
+from tools.k_visibility import count_crossings_batch, count_crossings_sweep, find_key_rays_adaptive, find_key_rays_from_events
+from tools.measurement_executor import MeasurementExecutor
+from tools.streaming import stream_triple_intersections
+from tools.geometric import find_strip_triples, combine_close_points
+from tools import instrumentation
 from shapely.geometry import Point, LineString
-from tqdm import tqdm
+import numpy as np
 import math
 
 def create_rays(width, height, dist_between_rays ,angle):
@@ -26,33 +28,36 @@ def create_rays(width, height, dist_between_rays ,angle):
             rays.append([(x1,0), (x2,height)])
     return rays
 
-def get_angle_mesurements(rays, building: AnyBuilding):
-    mesurements = []
-    for ray in tqdm(rays):
-        mesurements.append(count_crossings(ray, building.segments))
-    return mesurements
+def get_angle_mesurements(rays, building: AnyBuilding, method='batch'):
+    # rays from create_rays are parallel, and can be measured with a sweep
+    if method == 'sweep':
+        return count_crossings_sweep(rays, building.segments).tolist()
+    elif method == 'batch':
+        return count_crossings_batch(rays, building.segments).tolist()
+    raise ValueError(f"Unknown measurement method: {method}")
 
 
 def find_key_rays(rays, mesure):
+    # mesure can be a list or an array, e.g. memory-mapped from a measurement file
+    mesure = np.asarray(mesure)
     key_couples = []
-    for i in range(len(mesure) - 1):
-        if mesure[i] != mesure[i+1]:
-
-            key_couples.append({'rays': (rays[i], rays[i+1]), 'mesure': (mesure[i], mesure[i+1])})
-            # assert(abs(mesure[i] - mesure[i+1]) <= 2)
+    for i in np.nonzero(mesure[:-1] != mesure[1:])[0].tolist():
+        key_couples.append({'rays': (rays[i], rays[i+1]), 'mesure': (int(mesure[i]), int(mesure[i+1])), 'index': i})
+        # assert(abs(mesure[i] - mesure[i+1]) <= 2)
     return key_couples
 
 
 def find_triple_intersections(rays1, rays2, rays3, width, height):
     points = []
     min_dist = 0.1
-    for ray1 in tqdm(rays1):
-        for ray2 in rays2:
-            for ray3 in rays3:
-                p = center_of_three_parallel_pairs(ray1['rays'][0], ray1['rays'][1], ray2['rays'][0], ray2['rays'][1], ray3['rays'][0], ray3['rays'][1])
-                if p:
-                    if p[0] > -1*min_dist and p[1] > -1*min_dist and p[0] < width + min_dist and p[1] < height + min_dist:
-                        points.append({'rays': [ray1['rays'], ray2['rays'], ray3['rays']], 'mesure':[ray1['mesure'], ray2['mesure'], ray3['mesure']], 'point': p})
+    if not (rays1 and rays2 and rays3):
+        return points
+    strips = [np.array([ray['rays'] for ray in rays], dtype=float) for rays in (rays1, rays2, rays3)]
+    bounds = (-1*min_dist, -1*min_dist, width + min_dist, height + min_dist)
+    triples, centers = find_strip_triples(*strips, bounds)
+    for (i, j, k), p in zip(triples.tolist(), centers.tolist()):
+        ray1, ray2, ray3 = rays1[i], rays2[j], rays3[k]
+        points.append({'rays': [ray1['rays'], ray2['rays'], ray3['rays']], 'mesure':[ray1['mesure'], ray2['mesure'], ray3['mesure']], 'point': tuple(p)})
     return points
 
 
@@ -101,57 +106,238 @@ def find_internal_rays(p1, p2, exray1, exray2, width, height):
     return ray1, ray2
 
 def is_segment_there(p1, p2, dist_between_rays, building):
-    exray1, exray2 = find_external_rays(p1, p2, dist_between_rays, building.width, building.height)
-    inray1, inray2 = find_internal_rays(p1, p2, exray1, exray2, building.width, building.height)
-    mesurements = get_angle_mesurements([exray1, exray2, inray1, inray2], building)
-    if mesurements[0] + mesurements[1] + 2 == mesurements[2] + mesurements[3]:
-        return True
+    # verify_segments for a single pair
+    return bool(verify_segments([(0, 1)], [p1, p2], dist_between_rays, building))
+
+
+def frame_side_pairs(points, margin, width, height):
+    """
+    Pairs of points that are both within margin of the same frame wall,
+    as an (N,2) array of (i, j) with i < j.
+    """
+    pts = np.array(points, dtype=float).reshape(-1, 2)
+    pairs = [np.zeros((0, 2), dtype=int)]
+    for axis, size in ((0, width), (1, height)):
+        for side in (0, size):
+            near = np.nonzero(np.abs(pts[:, axis] - side) < margin)[0]
+            first, second = np.triu_indices(len(near), k=1)
+            pairs.append(np.stack([near[first], near[second]], axis=1))
+    return np.concatenate(pairs)
+
+
+def mesurements_from_key_rays(num_of_rays, key_rays):
+    """
+    The measurement of every ray of a family, implied by its key rays: the
+    count is constant between consecutive key rays, so the modes that do
+    not measure every ray can rebuild the dense measurement vector.
+
+    num_of_rays: the number of rays of the family
+    key_rays: its key rays, as returned by find_key_rays
+    returns: int array of shape (num_of_rays,), or None if there are no key
+        rays and the (constant) count is unknown
+    """
+    if not key_rays:
+        return None
+    keys = sorted(key_rays, key=lambda key: key['index'])
+    changes = np.array([key['index'] for key in keys]) + 1
+    values = np.array([keys[0]['mesure'][0]] + [key['mesure'][1] for key in keys])
+    return values[np.searchsorted(changes, np.arange(num_of_rays), side='right')]
+
+
+def _pairs_in_runs(keys_lo, keys_hi, order):
+    """
+    The pairs (i, j), i before j in order, with keys_hi[j] <= keys_lo[i].
+    keys_hi must be nondecreasing along order, so the partners of every
+    point are a run of the points after it, found by binary search.
+    """
+    n = len(order)
+    stop = np.searchsorted(keys_hi[order], keys_lo[order], side='right')
+    counts = np.maximum(stop - np.arange(1, n + 1), 0)
+    lower = np.repeat(np.arange(n), counts)
+    run_starts = np.repeat(np.cumsum(counts) - counts, counts)
+    upper = lower + 1 + np.arange(len(lower)) - run_starts
+    return order[lower], order[upper]
+
+
+def find_candidate_pairs(points, all_rays, mesurements, building: AnyBuilding, dist_between_rays):
+    """
+    Pairs of points that may be a wall, for verify_segments.
+
+    A wall between two points is crossed by every ray whose offset lies
+    between the projections of its end points, so all those rays must see
+    at least one wall besides the frame. Pairs failing this for any
+    measured angle can not be a wall and are not verified. The test of
+    verify_segments accepts some of these pairs, e.g. a corner and a point
+    close to the frame wall leaving it, so the reconstraction can have
+    fewer (phantom) segments than verifying every pair.
+
+    Every point is keyed, per angle, by the number of empty rays before its
+    projection (pushed in and out by the merge margin), so two points share
+    a run of non-empty rays when the key of the upper one does not exceed
+    the key of the lower one. Only the pairs sharing a run in the most
+    selective angle are enumerated, and then filtered by the other angles.
+
+    mesurements: the measurements of every angle, None for an angle whose
+        counts are unknown
+    returns: list of (i, j), i < j, in lexicographic order
+    """
+    margin = dist_between_rays*4
+    pts = np.array(points, dtype=float).reshape(-1, 2)
+    keys = []
+    for rays, mesure in zip(all_rays, mesurements):
+        if mesure is None:
+            continue
+        # the rays are parallel, so their start points and one direction describe them
+        starts = np.array([ray[0] for ray in rays], dtype=float)
+        direction = np.subtract(rays[0][1], rays[0][0])
+        normal = np.array([-direction[1], direction[0]]) / np.hypot(direction[0], direction[1])
+        offsets = starts @ normal
+        if offsets[-1] < offsets[0]:
+            offsets, normal = -offsets, -normal
+        mesure = np.asarray(mesure)
+        frame = count_crossings_sweep(np.stack([starts, starts + direction], axis=1), building.frame_segments)
+        empty = (mesure - frame <= 0) & (mesure != -1)
+        empty_before = np.concatenate([[0], np.cumsum(empty)])
+
+        proj = pts @ normal
+        keys_lo = empty_before[np.searchsorted(offsets, proj + margin, side='right')]
+        keys_hi = empty_before[np.searchsorted(offsets, proj - margin, side='left')]
+        keys.append((proj, keys_lo, keys_hi))
+
+    if keys:
+        def num_of_pairs(key):
+            proj, keys_lo, keys_hi = key
+            order = np.argsort(proj, kind='stable')
+            stop = np.searchsorted(keys_hi[order], keys_lo[order], side='right')
+            return np.maximum(stop - np.arange(1, len(order) + 1), 0).sum()
+        keys.sort(key=num_of_pairs)
+        proj, keys_lo, keys_hi = keys[0]
+        first, second = _pairs_in_runs(keys_lo, keys_hi, np.argsort(proj, kind='stable'))
+        for proj, keys_lo, keys_hi in keys[1:]:
+            swap = proj[first] > proj[second]
+            lower, upper = np.where(swap, second, first), np.where(swap, first, second)
+            keep = keys_hi[upper] <= keys_lo[lower]
+            first, second = first[keep], second[keep]
     else:
-        return False
-    
+        first, second = np.triu_indices(len(pts), k=1)
 
-def reconstract_building(building: AnyBuilding, present_results=False):
-    # we assume one wall every 4 meters 
-    estimated_num_of_walls = int(building.width * building.height / 9)
-    # this will return the distance between each ray we want to mesure
-    dist_between_rays = calculate_dist(building.width, building.height, estimated_num_of_walls, 0.99)
-    print(dist_between_rays)
-    num_of_angles = 9
-    all_rays = []
-    for i in range(num_of_angles):
-        angle = i * math.pi / num_of_angles
-        angle_rays = create_rays(building.width, building.height, dist_between_rays=dist_between_rays ,angle=angle)
-        all_rays.append(angle_rays)
-    
-    # find the k-visibility for each angle
-    inputs = []
-    for ray in all_rays:
-        inputs.append((ray, building))
-    with Pool(processes=6) as pool:
-        mesurements = pool.starmap(get_angle_mesurements, inputs)
+    pairs = np.concatenate([np.stack([np.minimum(first, second), np.maximum(first, second)], axis=1),
+                            frame_side_pairs(pts, margin, building.width, building.height)])
+    return [tuple(pair) for pair in np.unique(pairs.reshape(-1, 2), axis=0).tolist()]
+
+
+def verify_segments(pairs, points, dist_between_rays, building: AnyBuilding, processes=None):
+    # is_segment_there for many pairs, with all verification rays measured at
+    # once, on a pool when that pays off (see MeasurementExecutor)
+    instrumentation.count('is_segment_there_calls', len(pairs))
+    rays = []
+    for i, j in pairs:
+        exray1, exray2 = find_external_rays(points[i], points[j], dist_between_rays, building.width, building.height)
+        inray1, inray2 = find_internal_rays(points[i], points[j], exray1, exray2, building.width, building.height)
+        rays.extend([exray1, exray2, inray1, inray2])
+    mesurements = np.array(MeasurementExecutor(building.segments, processes).measure([rays], 'batch')[0],
+                           dtype=int).reshape(-1, 4)
+    found = mesurements[:, 0] + mesurements[:, 1] + 2 == mesurements[:, 2] + mesurements[:, 3]
+    return [pair for pair, is_there in zip(pairs, found.tolist()) if is_there]
+
+
+def reconstract_building_stream(chunks, width, height, num_of_angles=9):
+    """
+    Streaming version of the key ray and intersection stages of
+    reconstract_building, for measurements arriving as chunks of
+    (angle index, rays, mesurements, is_last) with angle i at
+    i * pi / num_of_angles (see tools.streaming).
+    yields: ((i, i+1, i+2), intersections) for the consecutive angle triples
+        (modulo num_of_angles), each as soon as its three angles are measured
+    """
+    def find_intersections(rays1, rays2, rays3):
+        return find_triple_intersections(rays1, rays2, rays3, width, height)
+    triples = [(i % num_of_angles, (i+1) % num_of_angles, (i+2) % num_of_angles) for i in range(num_of_angles)]
+    yield from stream_triple_intersections(chunks, triples, find_intersections)
+
+def reconstract_building(building: AnyBuilding, present_results=False, key_rays_mode='dense', processes=None,
+                         collect_metrics=False, coarse_stride=8, check_samples=0):
+    """
+    returns: the reconstracted segments, or (segments, metrics) with
+        collect_metrics, metrics being the stage timers, counters and values
+        of tools.instrumentation as a dict
+
+    key_rays_mode: 'dense' measures every ray, 'events' only the rays next to
+        projected wall endpoints, and 'adaptive' every coarse_stride-th ray,
+        bisecting where the count changes (coarse_stride=1 is the dense scan)
+    check_samples: number of random rays per angle the 'events' and
+        'adaptive' modes measure to validate their key rays, a ValueError is
+        raised if one disagrees
+    """
+    if collect_metrics:
+        with instrumentation.collect() as metrics:
+            segments = reconstract_building(building, present_results, key_rays_mode, processes,
+                                            coarse_stride=coarse_stride, check_samples=check_samples)
+        return segments, metrics.as_dict()
+
+    if key_rays_mode not in ('events', 'adaptive', 'dense'):
+        raise ValueError(f"Unknown key rays mode: {key_rays_mode}")
+    with instrumentation.timer('ray_creation'):
+        # we assume one wall every 4 meters 
+        estimated_num_of_walls = int(building.width * building.height / 9)
+        # this will return the distance between each ray we want to mesure
+        dist_between_rays = calculate_dist(building.width, building.height, estimated_num_of_walls, 0.99)
+        instrumentation.record('dist_between_rays', dist_between_rays)
+        num_of_angles = 9
+        all_rays = []
+        for i in range(num_of_angles):
+            angle = i * math.pi / num_of_angles
+            angle_rays = create_rays(building.width, building.height, dist_between_rays=dist_between_rays ,angle=angle)
+            all_rays.append(angle_rays)
     
-    key_rays = []
-    for i in range(len(all_rays)):
-        key_rays.append(find_key_rays(all_rays[i], mesurements[i]))
+    if key_rays_mode == 'events':
+        # measure only the rays next to projected wall endpoints
+        with instrumentation.timer('key_rays'):
+            key_rays = [find_key_rays_from_events(rays, building.segments, check_samples) for rays in all_rays]
+    elif key_rays_mode == 'adaptive':
+        # measure coarsely and refine only the intervals where the count changes
+        with instrumentation.timer('key_rays'):
+            key_rays = [find_key_rays_adaptive(rays, building.segments, coarse_stride, check_samples)
+                        for rays in all_rays]
+    else:
+        # find the k-visibility for each angle
+        with instrumentation.timer('measurement'):
+            mesurements = MeasurementExecutor(building.segments, processes).measure(all_rays, 'sweep')
+
+        with instrumentation.timer('key_rays'):
+            key_rays = []
+            for i in range(len(all_rays)):
+                key_rays.append(find_key_rays(all_rays[i], mesurements[i]))
+    instrumentation.count('key_rays', sum(len(rays) for rays in key_rays))
 
     intersections = []
     all_intersections = []
     n = len(key_rays)
-    for i in range(n):
-        angle_intersections = find_triple_intersections(key_rays[(i) % n], key_rays[(i+1) % n], key_rays[(i+2) % n], building.width, building.height)
-        intersections.append([a['point'] for a in angle_intersections])
-        all_intersections.extend([a['point'] for a in angle_intersections])
-    all_intersections = combine_close_points(all_intersections, dist_between_rays*4)
+    with instrumentation.timer('triple_intersections'):
+        for i in range(n):
+            angle_intersections = find_triple_intersections(key_rays[(i) % n], key_rays[(i+1) % n], key_rays[(i+2) % n], building.width, building.height)
+            intersections.append([a['point'] for a in angle_intersections])
+            all_intersections.extend([a['point'] for a in angle_intersections])
+    instrumentation.count('intersections', len(all_intersections))
+    with instrumentation.timer('merging'):
+        all_intersections = combine_close_points(all_intersections, dist_between_rays*4)
+    instrumentation.count('candidate_points', len(all_intersections))
+    with instrumentation.timer('candidate_pairs'):
+        if key_rays_mode != 'dense':
+            mesurements = [mesurements_from_key_rays(len(rays), angle_key_rays)
+                           for rays, angle_key_rays in zip(all_rays, key_rays)]
+        pairs = find_candidate_pairs(all_intersections, all_rays, mesurements, building, dist_between_rays)
+    instrumentation.count('candidate_pairs', len(pairs))
     segments = []
-    for i in range(len(all_intersections) - 1):
-        for j in range(i+1, len(all_intersections)):
-            if is_segment_there(all_intersections[i], all_intersections[j], dist_between_rays, building):
-                segments.append([all_intersections[i],all_intersections[j]])
-            
+    with instrumentation.timer('verification'):
+        for i, j in verify_segments(pairs, all_intersections, dist_between_rays, building, processes):
+            segments.append([all_intersections[i],all_intersections[j]])
+    instrumentation.count('accepted_segments', len(segments))
+
     if present_results:
         present_segments([building.segments, segments], side_by_side=True, same_scale=False)
 
-    return None
+    return segments
 
 if __name__ == '__main__':
 
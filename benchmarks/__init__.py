@@ -0,0 +1,9 @@
+"""benchmarks package
+
+Headless timing of the reconstruction pipelines, see run_benchmarks.py.
+Run it from the workspace root with `python -m benchmarks.run_benchmarks`.
+"""
+
+__all__ = [
+    "run_benchmarks",
+]
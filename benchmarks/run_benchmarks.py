@@ -0,0 +1,184 @@
+"""
+Headless benchmark of the grid, strait and any reconstruction pipelines.
+
+Every configuration (family, building size, wall count) is run on a fixed
+set of seeded buildings from tools.corpus, and each pipeline stage is timed
+separately. Results are written as JSON and, given a baseline JSON from an
+earlier run, compared stage by stage. The quick preset is compared with the
+committed benchmarks/baseline_quick.json unless --baseline says otherwise;
+regenerate it with --output after an intended speed change.
+
+    python -m benchmarks.run_benchmarks --fail-on-regression
+    python -m benchmarks.run_benchmarks --preset full --output results.json
+    python -m benchmarks.run_benchmarks --preset full --baseline results.json
+"""
+import sys, os
+# the shared path setup of the tests, which the pipelines need as well
+from tests import conftest
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import tempfile
+import time
+import numpy as np
+from any_building_reconstraction import reconstraction_algorithm as any_algorithm
+from grid_building_reconstraction import grid_search_algorithm as grid_algorithm
+from strait_building_reconstraction import reconstraction_algorithm as strait_algorithm
+from tools import instrumentation
+from tools.corpus import corpus_specs, load_or_build_corpus
+
+# results of the quick preset with the default arguments, see --baseline
+DEFAULT_BASELINES = {'quick': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_quick.json')}
+
+# (family, width, height, num_of_segments or fill probability)
+PRESETS = {
+    'quick': [
+        ('grid', 20, 20, 0.3), ('grid', 200, 200, 0.3),
+        ('strait', 8, 10, 14), ('strait', 16, 20, 40),
+        ('any', 8, 10, 8),
+    ],
+    'full': [
+        ('grid', 20, 20, 0.3), ('grid', 200, 200, 0.3), ('grid', 1000, 1000, 0.3),
+        ('strait', 8, 10, 14), ('strait', 16, 20, 40), ('strait', 32, 40, 120),
+        ('any', 8, 10, 8), ('any', 8, 10, 14), ('any', 16, 20, 30),
+    ],
+}
+
+def run_grid(building):
+    reconstracted_building, metrics = grid_algorithm.reconstract_building(building, False, collect_metrics=True)
+    return reconstracted_building.segments, metrics
+
+def run_strait(building):
+    return strait_algorithm.reconstract_building(building, collect_metrics=True)
+
+def run_any(building):
+    return any_algorithm.reconstract_building(building, collect_metrics=True)
+
+RUNNERS = {'grid': run_grid, 'strait': run_strait, 'any': run_any}
+
+def config_key(result):
+    return (result['family'], result['width'], result['height'], result['size'])
+
+def run_config(family, width, height, size, num_of_buildings, first_seed, corpus_dir, repeat=3):
+    if family == 'grid':
+        specs = corpus_specs(family, num_of_buildings, first_seed, width, height, prob=size)
+    else:
+        specs = corpus_specs(family, num_of_buildings, first_seed, width, height, num_of_segments=size)
+    path = os.path.join(corpus_dir, f"{family}_{width}x{height}_{size}_{first_seed}_{num_of_buildings}")
+    corpus = load_or_build_corpus(path, specs)
+
+    # the fastest of repeat runs is the least disturbed by other load
+    best = None
+    for _ in range(repeat):
+        # sum the metrics reconstract_building returns for every building
+        metrics = instrumentation.Metrics()
+        num_of_segments = []
+        values = {}
+        for building in corpus:
+            # the algorithms print 'illigal point' diagnostics, keep the report readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                segments, building_metrics = RUNNERS[family](building)
+            num_of_segments.append(len(segments))
+            for name, seconds in building_metrics['timers'].items():
+                metrics.timers[name] = metrics.timers.get(name, 0.0) + seconds
+            for name, total in building_metrics['counters'].items():
+                metrics.count(name, total)
+            for name, value in building_metrics['values'].items():
+                values.setdefault(name, []).append(value)
+        metrics.values = {name: float(np.mean(building_values)) for name, building_values in values.items()}
+        if best is None or sum(metrics.timers.values()) < sum(best.timers.values()):
+            best = metrics
+    stages = best.timers
+    return {
+        'family': family, 'width': width, 'height': height, 'size': size,
+        'buildings': len(corpus),
+        'walls': float(np.mean([len(corpus.segments(i)) for i in range(len(corpus))])),
+        'segments_found': float(np.mean(num_of_segments)),
+        'stages': {name: seconds / len(corpus) for name, seconds in stages.items()},
+        'total': sum(stages.values()) / len(corpus),
+        'counters': {name: total / len(corpus) for name, total in best.counters.items()},
+        'values': best.values,
+    }
+
+def compare(results, baseline, threshold, min_seconds=1e-3):
+    """
+    Stage by stage ratio of results to baseline for the configurations in both.
+    A stage regresses if it is more than threshold times slower and at least
+    min_seconds slower, so sub-millisecond stages do not flag timer noise.
+    returns: list of (config key, stage, baseline seconds, seconds, ratio, regression)
+    """
+    baseline_by_key = {config_key(result): result for result in baseline['results']}
+    rows = []
+    for result in results:
+        base = baseline_by_key.get(config_key(result))
+        if base is None:
+            continue
+        stages = dict(result['stages'], total=result['total'])
+        base_stages = dict(base['stages'], total=base['total'])
+        for stage, seconds in stages.items():
+            if stage not in base_stages or base_stages[stage] == 0:
+                continue
+            ratio = seconds / base_stages[stage]
+            rows.append((config_key(result), stage, base_stages[stage], seconds, ratio,
+                         ratio > threshold and seconds - base_stages[stage] >= min_seconds))
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='quick')
+    parser.add_argument('--families', nargs='+', choices=sorted(RUNNERS), default=sorted(RUNNERS))
+    parser.add_argument('--buildings', type=int, default=3, help='buildings per configuration')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first building')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per configuration, the fastest is kept')
+    parser.add_argument('--corpus-dir', default=os.path.join(tempfile.gettempdir(), 'building_reconstraction_corpus'))
+    parser.add_argument('--output', help='write the results as JSON to this path')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare with, '
+                        'by default the committed baseline of the preset if it has one')
+    parser.add_argument('--threshold', type=float, default=1.25, help='slowdown ratio reported as a regression')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args(argv)
+
+    # read the baseline first, --output may overwrite it
+    baseline = None
+    baseline_path = args.baseline or DEFAULT_BASELINES.get(args.preset)
+    if baseline_path and os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+
+    results = []
+    for family, width, height, size in PRESETS[args.preset]:
+        if family not in args.families:
+            continue
+        result = run_config(family, width, height, size, args.buildings, args.seed, args.corpus_dir, args.repeat)
+        results.append(result)
+        stages = ', '.join(f"{name} {seconds*1000:.1f}ms" for name, seconds in result['stages'].items())
+        print(f"{family} {width}x{height} {size}: {result['total']*1000:.1f}ms per building ({stages})")
+
+    report = {
+        'meta': {
+            'preset': args.preset, 'buildings': args.buildings, 'seed': args.seed, 'repeat': args.repeat,
+            'python': platform.python_version(), 'numpy': np.__version__,
+            'machine': platform.machine(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+
+    regressions = []
+    if baseline is not None:
+        for key, stage, base_seconds, seconds, ratio, regression in compare(results, baseline, args.threshold):
+            flag = '  REGRESSION' if regression else ''
+            print(f"{' '.join(map(str, key))} {stage}: {base_seconds*1000:.1f}ms -> {seconds*1000:.1f}ms (x{ratio:.2f}){flag}")
+            if regression:
+                regressions.append((key, stage))
+    if regressions and args.fail_on_regression:
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,18 +6,19 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 import numpy as np
-import random
 from tools.segment_presentation import present_segments
 
 class GridBuilding():
-    def __init__(self, width, height, frame=True, segments=None):
+    def __init__(self, width, height, frame=True, segments=None, rng=None, prob=0.1):
         self.width = width
         self.height = height
+        # the walls are kept in the boolean line arrays, segments is the merged list derived from them
         self.segments = segments
+        self.rng = rng if rng is not None else np.random.default_rng()
         if segments is None:
             self._horizontal_lines = np.zeros((width,height+1), dtype=bool)
             self._vertical_lines = np.zeros((width+1,height), dtype=bool)
-            self.fill_grid_randomly()
+            self.fill_grid_randomly(prob)
             if frame:
                 self.fill_frame()
 
@@ -27,56 +28,47 @@ class GridBuilding():
         Continuous horizontal and vertical segments are merged into longer segments.
         """
         self.segments = []
-        # Process horizontal lines - merge consecutive horizontal segments
-        for j in range(self.height + 1):  # for each row
-            i = 0
-            while i < self.width:
-                if self._horizontal_lines[i][j]:
-                    # Found start of a horizontal segment
-                    start_i = i
-                    # Find the end of consecutive segments
-                    while i < self.width and self._horizontal_lines[i][j]:
-                        i += 1
-                    end_i = i
-                    # Add merged segment from (start_i, j) to (end_i, j)
-                    self.segments.append(((start_i, j), (end_i, j)))
-                else:
-                    i += 1
-        
-        # Process vertical lines - merge consecutive vertical segments  
-        for i in range(self.width + 1):  # for each column
-            j = 0
-            while j < self.height:
-                if self._vertical_lines[i][j]:
-                    # Found start of a vertical segment
-                    start_j = j
-                    # Find the end of consecutive segments
-                    while j < self.height and self._vertical_lines[i][j]:
-                        j += 1
-                    end_j = j
-                    # Add merged segment from (i, start_j) to (i, end_j)
-                    self.segments.append(((i, start_j), (i, end_j)))
-                else:
-                    j += 1
-        
+        # Process horizontal lines - merge consecutive horizontal segments, row by row
+        for j, start_i, end_i in self._runs(self._horizontal_lines.T):
+            self.segments.append(((start_i, j), (end_i, j)))
+        # Process vertical lines - merge consecutive vertical segments, column by column
+        for i, start_j, end_j in self._runs(self._vertical_lines):
+            self.segments.append(((i, start_j), (i, end_j)))
+
+    def update_lines(self):
+        """
+        Sets the line arrays from self.segments, the inverse of update_segments,
+        for buildings created from a segment list.
+        """
+        self._horizontal_lines = np.zeros((self.width, self.height+1), dtype=bool)
+        self._vertical_lines = np.zeros((self.width+1, self.height), dtype=bool)
+        for (x1, y1), (x2, y2) in self.segments:
+            if y1 == y2:
+                self._horizontal_lines[int(min(x1, x2)):int(max(x1, x2)), int(y1)] = True
+            else:
+                self._vertical_lines[int(x1), int(min(y1, y2)):int(max(y1, y2))] = True
+
+    @staticmethod
+    def _runs(lines):
+        """
+        (row, start, end) of every run of consecutive True values along the rows
+        of a boolean array, ordered by row and then by start.
+        """
+        padded = np.zeros((lines.shape[0], lines.shape[1] + 2), dtype=np.int8)
+        padded[:, 1:-1] = lines
+        edges = np.diff(padded, axis=1)
+        rows, starts = np.nonzero(edges == 1)
+        _, ends = np.nonzero(edges == -1)
+        return zip(rows.tolist(), starts.tolist(), ends.tolist())
+
     def fill_frame(self):
-        for i in range(self.width):
-            self._horizontal_lines[i][0] = 1
-            self._horizontal_lines[i][-1] = 1
-        for i in range(self.height):
-            self._vertical_lines[0][i] = 1
-            self._vertical_lines[-1][i] = 1
+        self._horizontal_lines[:, [0, -1]] = 1
+        self._vertical_lines[[0, -1], :] = 1
         self.update_segments()
-    
+
     def fill_grid_randomly(self, prob=0.1):
-        for i in range(self.width):
-            for j in range(self.height + 1):
-                if random.random()<prob:
-                    self._horizontal_lines[i][j] = 1
-        for i in range(self.width+1):
-            for j in range(self.height):
-                if random.random()<prob:
-                    self._vertical_lines[i][j] = 1
+        self._horizontal_lines |= self.rng.random(self._horizontal_lines.shape) < prob
+        self._vertical_lines |= self.rng.random(self._vertical_lines.shape) < prob
         self.update_segments()
 
 
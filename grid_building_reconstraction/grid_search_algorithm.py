@@ -1,6 +1,8 @@
 from building import GridBuilding 
 import random
-from tools.k_visibility import count_crossings
+import numpy as np
+from tools import instrumentation
+from tools.k_visibility import SegmentIndex
 from tools.segment_presentation import present_segments
 
 def create_angled_rays(width, height):
@@ -14,18 +16,129 @@ def create_angled_rays(width, height):
     return right_angle_rays, left_angle_rays
     
 def get_angle_mesurements(right_angle_rays, left_angle_rays, building: GridBuilding):
+    index = SegmentIndex(building.segments)
     right_angle_rays_mesurements = []
     for ray in right_angle_rays:
-        right_angle_rays_mesurements.append(count_crossings(ray, building.segments))
+        right_angle_rays_mesurements.append(index.count_crossings(ray))
     left_angle_rays_mesurements = []
     for ray in left_angle_rays:
-        left_angle_rays_mesurements.append(count_crossings(ray, building.segments))
+        left_angle_rays_mesurements.append(index.count_crossings(ray))
+    return right_angle_rays_mesurements, left_angle_rays_mesurements
+
+def get_grid_mesurements(building: GridBuilding):
+    """
+    The measurements of get_angle_mesurements for the rays of
+    create_angled_rays, computed from the building's line arrays without
+    building any geometry.
+
+    Left ray i is at x = (i - y - 1/2) / (height+1) at height y, right ray i
+    at x = (i + y + 1/2) / (height+1) - 1, so no ray ever passes through a
+    lattice point and each ray crosses a row or a column at most once.
+    A horizontal unit edge is crossed by a run of height+1 consecutive rays
+    (added with a difference array and a prefix sum) and a vertical unit
+    edge by exactly one ray of each family.
+    """
+    width, height = building.width, building.height
+    num_of_rays = (width + 1)*(height + 1) + 1
+    e, j = np.nonzero(building._horizontal_lines)
+    k, m = np.nonzero(building._vertical_lines)
+
+    def count(first_ray, vertical_ray):
+        last_ray = first_ray + height + 1
+        diff = np.bincount(np.clip(first_ray, 0, num_of_rays), minlength=num_of_rays + 1) \
+            - np.bincount(np.clip(last_ray, 0, num_of_rays), minlength=num_of_rays + 1)
+        counts = np.cumsum(diff)[:num_of_rays]
+        vertical_ray = vertical_ray[(vertical_ray >= 0) & (vertical_ray < num_of_rays)]
+        return (counts + np.bincount(vertical_ray, minlength=num_of_rays)).tolist()
+
+    right_angle_rays_mesurements = count((e + 1)*(height + 1) - j, (k + 1)*(height + 1) - m - 1)
+    left_angle_rays_mesurements = count(e*(height + 1) + j + 1, k*(height + 1) + m + 1)
     return right_angle_rays_mesurements, left_angle_rays_mesurements
 
 def get_grid(right_angle_ray_mesurements, left_angle_ray_mesurements, width, height):
-    # moving through all points in the grid
-    points_directions = find_points_direction(right_angle_ray_mesurements, left_angle_ray_mesurements, width, height)
-    segments = find_segments(points_directions, width, height, right_angle_ray_mesurements, left_angle_ray_mesurements)
+    # classify all points in the grid at once
+    with instrumentation.timer('directions'):
+        directions = find_points_direction_arrays(right_angle_ray_mesurements, left_angle_ray_mesurements, width, height)
+    with instrumentation.timer('segments'):
+        segments = find_segments_from_arrays(directions)
+    instrumentation.count('accepted_segments', len(segments))
+    return segments
+
+def find_points_direction_arrays(right_angle_ray_mesurements, left_angle_ray_mesurements, width, height):
+    """
+    Array version of find_points_direction.
+    returns: dict of 'up', 'down', 'left' and 'right' boolean arrays of
+        shape (width+1, height+1), indexed by [x, y], with the same rule
+        precedence as find_direction
+    """
+    x = np.arange(width + 1)[:, None]
+    y = np.arange(height + 1)[None, :]
+    right_mesurements = np.asarray(right_angle_ray_mesurements)
+    left_mesurements = np.asarray(left_angle_ray_mesurements)
+    # same indices as find_intersection_rays
+    d_r = right_mesurements[(height+1)*(1 + x) - y - 1] - right_mesurements[(height+1)*(1 + x) - y]
+    d_l = left_mesurements[(height+1)*x + y] - left_mesurements[(height+1)*x + y + 1]
+
+    rules = [
+        (d_r == 2, ('up', 'left')),
+        (d_r == -2, ('down', 'right')),
+        (d_l == 2, ('down', 'left')),
+        (d_l == -2, ('up', 'right')),
+        ((d_r == 1) & (d_l == 1), ('left',)),
+        ((d_r == -1) & (d_l == 1), ('down',)),
+        ((d_r == 1) & (d_l == -1), ('up',)),
+        ((d_r == -1) & (d_l == -1), ('right',)),
+    ]
+    directions = {key: np.zeros(d_r.shape, dtype=bool) for key in ('up', 'down', 'left', 'right')}
+    unmatched = np.ones(d_r.shape, dtype=bool)
+    for condition, keys in rules:
+        # like the elif chain, a point takes the first rule it matches
+        matched = condition & unmatched
+        for key in keys:
+            directions[key] |= matched
+        unmatched &= ~condition
+    illegal = unmatched & ((np.abs(d_r) > 2) | (np.abs(d_l) > 2))
+    if illegal.any():
+        print(f'illigal point x{np.count_nonzero(illegal)}')
+    return directions
+
+def _pair_open_close(opens, closes):
+    """
+    Pairs every close with the open before it along the rows of two boolean
+    arrays, like the open_point scan of find_segments.
+    returns: row, open column and close column arrays, ordered by row and
+        then by column
+
+    Raises:
+        ValueError if a close has no open before it in its row.
+    """
+    closes = closes & ~opens
+    rows, cols = np.nonzero(opens | closes)
+    is_close = closes[rows, cols]
+    close_idx = np.nonzero(is_close)[0]
+    prev_idx = close_idx - 1
+    # a close needs an open right before it in the same row
+    paired = prev_idx >= 0
+    paired[paired] = (rows[prev_idx[paired]] == rows[close_idx[paired]]) & ~is_close[prev_idx[paired]]
+    if not paired.all():
+        row, col = rows[close_idx[~paired][0]], cols[close_idx[~paired][0]]
+        raise ValueError(f"Close at row {row}, column {col} has no open before it")
+    return rows[close_idx], cols[prev_idx], cols[close_idx]
+
+def find_segments_from_arrays(directions):
+    """
+    Array version of find_segments, takes the output of
+    find_points_direction_arrays and returns the segments in the same order.
+    """
+    segments = []
+    # find horizontal segments, row by row
+    ys, start_xs, end_xs = _pair_open_close(directions['right'].T, directions['left'].T)
+    for y, start_x, end_x in zip(ys.tolist(), start_xs.tolist(), end_xs.tolist()):
+        segments.append(((start_x, y), (end_x, y)))
+    # find vertical segments, column by column
+    xs, start_ys, end_ys = _pair_open_close(directions['up'], directions['down'])
+    for x, start_y, end_y in zip(xs.tolist(), start_ys.tolist(), end_ys.tolist()):
+        segments.append(((x, start_y), (x, end_y)))
     return segments
 
 def find_points_direction(right_angle_ray_mesurements, left_angle_ray_mesurements, width, height):
@@ -107,11 +220,26 @@ def find_intersection_rays(point, height, width):
     left_indices = [l1, l2]
     return right_indices, left_indices
 
-def reconstract_building(building: GridBuilding, presen_results):
-    # define the angles to mesure
-    right_angle_rays, left_angle_rays = create_angled_rays(building.width, building.height)
+def reconstract_building(building: GridBuilding, presen_results, collect_metrics=False):
+    """
+    returns: the reconstracted GridBuilding, or (building, metrics) with
+        collect_metrics, metrics being the stage timers, counters and values
+        of tools.instrumentation as a dict
+    """
+    if collect_metrics:
+        with instrumentation.collect() as metrics:
+            reconstracted_building = reconstract_building(building, presen_results)
+        return reconstracted_building, metrics.as_dict()
+
     # find the k-visibility for each angle
-    right_angle_ray_mesurements, left_angle_ray_mesurements = get_angle_mesurements(right_angle_rays, left_angle_rays, building)
+    # buildings given as segments have no line arrays, measure them with rays
+    with instrumentation.timer('measurement'):
+        if hasattr(building, '_horizontal_lines'):
+            right_angle_ray_mesurements, left_angle_ray_mesurements = get_grid_mesurements(building)
+        else:
+            # define the angles to mesure
+            right_angle_rays, left_angle_rays = create_angled_rays(building.width, building.height)
+            right_angle_ray_mesurements, left_angle_ray_mesurements = get_angle_mesurements(right_angle_rays, left_angle_rays, building)
     # reconstract the building using the k-vsibility mesurements
     segments = get_grid(right_angle_ray_mesurements, left_angle_ray_mesurements, building.width, building.height)
     reconstracted_building = GridBuilding(width=building.width, height=building.height, segments=segments)
@@ -56,6 +56,9 @@ class WiFiSimulator:
         self.source_position = source_position
         self.source_power_dbm = source_power_dbm
         self.walls: List[Wall] = []
+        # Angular partition of the walls around the source, see _angular_partition
+        self._partition_key = None
+        self._partition = None
     
     def add_wall(self, start: Tuple[float, float], end: Tuple[float, float], 
                  attenuation_db: float = 10.0):
@@ -127,9 +130,185 @@ class WiFiSimulator:
         
         return received_power
     
+    def _wall_arrays(self) -> Tuple[np.ndarray, ...]:
+        """Wall start x, start y, end x, end y and attenuation as (W,) arrays."""
+        cx, cy = np.array([wall.start for wall in self.walls], dtype=float).reshape(-1, 2).T
+        ex, ey = np.array([wall.end for wall in self.walls], dtype=float).reshape(-1, 2).T
+        attenuation = np.array([wall.attenuation_db for wall in self.walls], dtype=float)
+        return cx, cy, ex, ey, attenuation
+    
+    def _crossed_attenuation(self, points: np.ndarray, walls: Tuple[np.ndarray, ...],
+                             check_direction: bool = True,
+                             chunk_size: Optional[int] = None) -> np.ndarray:
+        """
+        Total attenuation of the given walls crossed by the paths from the
+        source to the points, with the ccw test of Wall.intersects_line.
+        
+        Args:
+            points: (N, 2) array of target point coordinates
+            walls: The walls to test, as returned by _wall_arrays
+            check_direction: Whether to test that the path points between the
+                wall endpoints; callers that already know it does skip it
+            chunk_size: Number of points tested against the walls at a time
+            
+        Returns:
+            (N,) array of attenuations in dB
+        """
+        sx, sy = self.source_position
+        cx, cy, ex, ey, attenuation = walls
+        wall_loss = np.zeros(len(points))
+        if len(attenuation) == 0:
+            return wall_loss
+        # ccw(A, C, D) with A the source does not depend on the point
+        source_side = (ey - sy) * (cx - sx) > (cy - sy) * (ex - sx)
+        if chunk_size is None:
+            chunk_size = max(1, 2**16 // len(attenuation))
+        for start in range(0, len(points), chunk_size):
+            px = points[start:start + chunk_size, 0, None]
+            py = points[start:start + chunk_size, 1, None]
+            # intersect(A, B, C, D) of Wall.intersects_line with B the point
+            hits = source_side != ((ey - py) * (cx - px) > (cy - py) * (ex - px))
+            if check_direction:
+                c_side = (cy - sy) * (px - sx) > (py - sy) * (cx - sx)
+                d_side = (ey - sy) * (px - sx) > (py - sy) * (ex - sx)
+                hits &= c_side != d_side
+            wall_loss[start:start + chunk_size] = hits @ attenuation
+        return wall_loss
+    
+    def _angular_partition(self):
+        """
+        Angular partition of the plane around the source.
+        
+        Sorting the directions from the source to all wall endpoints splits
+        the plane into sectors; a path from the source whose direction lies
+        inside a sector points between the endpoints of exactly the walls
+        spanning that sector, so only those walls remain to be tested, by
+        the side of their line the target point is on. Walls whose line
+        passes through the source span no sector and are tested directly.
+        The partition is cached until the source or the walls change.
+        
+        Returns:
+            Tuple of (walls, bounds, sector_walls, degenerate): the
+            _wall_arrays, the sorted sector start angles, the wall indices
+            spanning each sector and the indices of the walls to test directly
+        """
+        key = (tuple(self.source_position),
+               tuple((wall.start, wall.end, wall.attenuation_db) for wall in self.walls))
+        if self._partition_key == key:
+            return self._partition
+        
+        sx, sy = self.source_position
+        walls = self._wall_arrays()
+        cx, cy, ex, ey, _ = walls
+        cross = (cx - sx) * (ey - sy) - (cy - sy) * (ex - sx)
+        degenerate = np.nonzero(cross == 0)[0]
+        spanning = np.nonzero(cross != 0)[0]
+        start_angle = np.arctan2(cy - sy, cx - sx)[spanning]
+        end_angle = np.arctan2(ey - sy, ex - sx)[spanning]
+        # every wall spans less than half a turn, counterclockwise from lo to hi
+        ccw_order = cross[spanning] > 0
+        lo = np.where(ccw_order, start_angle, end_angle)
+        hi = np.where(ccw_order, end_angle, start_angle)
+        
+        bounds = np.unique(np.concatenate([lo, hi]))
+        sector_walls = []
+        if len(bounds):
+            lo_idx = np.searchsorted(bounds, lo)
+            num_of_sectors = (np.searchsorted(bounds, hi) - lo_idx) % len(bounds)
+            wall_of = np.repeat(spanning, num_of_sectors)
+            first = np.repeat(np.cumsum(num_of_sectors) - num_of_sectors, num_of_sectors)
+            sector_of = (np.repeat(lo_idx, num_of_sectors) + np.arange(len(wall_of)) - first) % len(bounds)
+            order = np.argsort(sector_of, kind='stable')
+            splits = np.searchsorted(sector_of[order], np.arange(1, len(bounds)))
+            sector_walls = np.split(wall_of[order], splits)
+        
+        self._partition_key = key
+        self._partition = (walls, bounds, sector_walls, degenerate)
+        return self._partition
+    
+    def calculate_wall_attenuations(self, points: np.ndarray, method: str = 'sectors',
+                                    chunk_size: Optional[int] = None) -> np.ndarray:
+        """
+        Calculate total wall attenuation for the paths from the source to many points.
+        
+        Args:
+            points: (N, 2) array of target point coordinates
+            method: 'direct' tests every wall for every point, 'sectors' only
+                the walls spanning the angular sector of each point (see
+                _angular_partition). Points within 1e-9 radians of a sector
+                bound fall back to the direct test, so both agree.
+            chunk_size: Number of points tested against the walls at a time,
+                by default sized to keep the (points, walls) arrays small
+                enough to stay in cache
+            
+        Returns:
+            (N,) array of attenuations in dB
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        if method == 'direct':
+            return self._crossed_attenuation(points, self._wall_arrays(), chunk_size=chunk_size)
+        if method != 'sectors':
+            raise ValueError(f"Unknown attenuation method: {method}")
+        
+        walls, bounds, sector_walls, degenerate = self._angular_partition()
+        wall_loss = self._crossed_attenuation(points, [a[degenerate] for a in walls], chunk_size=chunk_size)
+        if len(bounds) == 0:
+            return wall_loss
+        sx, sy = self.source_position
+        angle = np.arctan2(points[:, 1] - sy, points[:, 0] - sx)
+        # the last sector wraps around from the largest bound to the smallest
+        sector = (np.searchsorted(bounds, angle, side='right') - 1) % len(bounds)
+        # paths along a sector bound may touch the endpoint of a wall
+        to_lower = (angle - bounds[sector]) % (2 * math.pi)
+        to_upper = (bounds[(sector + 1) % len(bounds)] - angle) % (2 * math.pi)
+        on_bound = np.minimum(to_lower, to_upper) <= 1e-9
+        spanning = np.ones(len(walls[0]), dtype=bool)
+        spanning[degenerate] = False
+        wall_loss[on_bound] += self._crossed_attenuation(
+            points[on_bound], [a[spanning] for a in walls], chunk_size=chunk_size)
+        
+        sector[on_bound] = -1
+        order = np.argsort(sector, kind='stable')
+        sector_starts = np.searchsorted(sector[order], np.arange(len(bounds) + 1))
+        for k in np.nonzero(np.diff(sector_starts))[0]:
+            point_idx = order[sector_starts[k]:sector_starts[k + 1]]
+            wall_loss[point_idx] += self._crossed_attenuation(
+                points[point_idx], [a[sector_walls[k]] for a in walls], check_direction=False, chunk_size=chunk_size)
+        return wall_loss
+    
+    def calculate_signal_strengths(self, points: np.ndarray, method: str = 'sectors',
+                                   chunk_size: Optional[int] = None) -> np.ndarray:
+        """
+        Calculate signal strength at many points at once, with the same
+        formulas as calculate_signal_strength.
+        
+        Args:
+            points: (N, 2) array of target point coordinates
+            method: Wall attenuation method, see calculate_wall_attenuations
+            chunk_size: See calculate_wall_attenuations
+            
+        Returns:
+            (N,) array of signal strengths in dBm
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        sx, sy = self.source_position
+        dx = points[:, 0] - sx
+        dy = points[:, 1] - sy
+        distance = np.sqrt(dx*dx + dy*dy)
+        
+        # Free space path loss, 0 at the source itself
+        path_loss = np.zeros(len(points))
+        nonzero = distance != 0
+        path_loss[nonzero] = 20 * np.log10(distance[nonzero] / 1000.0) + 20 * math.log10(2400.0) + 32.44
+        
+        wall_loss = self.calculate_wall_attenuations(points, method, chunk_size)
+        
+        return self.source_power_dbm - path_loss - wall_loss
+    
     def generate_heatmap(self, x_range: Tuple[float, float], 
                         y_range: Tuple[float, float],
-                        resolution: int = 100) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+                        resolution: int = 100,
+                        method: str = 'sectors') -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
         """
         Generate a heatmap of signal strength.
         
@@ -137,6 +316,7 @@ class WiFiSimulator:
             x_range: (min_x, max_x) range for heatmap
             y_range: (min_y, max_y) range for heatmap
             resolution: Number of points along each axis
+            method: Wall attenuation method, see calculate_wall_attenuations
             
         Returns:
             Tuple of (X, Y, signal_strength) arrays for plotting
@@ -145,12 +325,8 @@ class WiFiSimulator:
         y = np.linspace(y_range[0], y_range[1], resolution)
         X, Y = np.meshgrid(x, y)
         
-        signal_strength = np.zeros_like(X)
-        
-        for i in range(len(y)):
-            for j in range(len(x)):
-                point = (X[i, j], Y[i, j])
-                signal_strength[i, j] = self.calculate_signal_strength(point)
+        points = np.column_stack([X.ravel(), Y.ravel()])
+        signal_strength = self.calculate_signal_strengths(points, method).reshape(X.shape)
         
         return X, Y, signal_strength
     
@@ -1,11 +1,14 @@
-from multiprocessing import Pool
 from strait_building import StraitBuilding
 from tools.confirm_dist_calculation import calculate_dist
 from tools.segment_presentation import present_segments
-from tools.k_visibility import count_crossings
-from tools.geometric import center_of_three_parallel_pairs
+from tools.k_visibility import count_crossings_batch, count_crossings_sweep, find_key_rays_adaptive, find_key_rays_from_events
+from tools.measurement_executor import MeasurementExecutor
+from tools.measurement_io import read_measurements, record_for_angle, write_measurements
+from tools.streaming import stream_triple_intersections
+from tools.geometric import find_strip_triples
+from tools import instrumentation
 from shapely.geometry import Point, LineString
-from tqdm import tqdm
+import numpy as np
 import math
 
 def create_rays(width, height, dist_between_rays ,angle):
@@ -23,33 +26,36 @@ def create_rays(width, height, dist_between_rays ,angle):
             rays.append([(x1,0), (x2,height)])
     return rays
 
-def get_angle_mesurements(rays, building: StraitBuilding):
-    mesurements = []
-    for ray in tqdm(rays):
-        mesurements.append(count_crossings(ray, building.segments))
-    return mesurements
+def get_angle_mesurements(rays, building: StraitBuilding, method='batch'):
+    # rays from create_rays are parallel, and can be measured with a sweep
+    if method == 'sweep':
+        return count_crossings_sweep(rays, building.segments).tolist()
+    elif method == 'batch':
+        return count_crossings_batch(rays, building.segments).tolist()
+    raise ValueError(f"Unknown measurement method: {method}")
 
 
 def find_key_rays(rays, mesure):
+    # mesure can be a list or an array, e.g. memory-mapped from a measurement file
+    mesure = np.asarray(mesure)
     key_couples = []
-    for i in range(len(mesure) - 1):
-        if mesure[i] != mesure[i+1]:
-
-            key_couples.append({'rays': (rays[i], rays[i+1]), 'mesure': (mesure[i], mesure[i+1])})
-            # assert(abs(mesure[i] - mesure[i+1]) <= 2)
+    for i in np.nonzero(mesure[:-1] != mesure[1:])[0].tolist():
+        key_couples.append({'rays': (rays[i], rays[i+1]), 'mesure': (int(mesure[i]), int(mesure[i+1])), 'index': i})
+        # assert(abs(mesure[i] - mesure[i+1]) <= 2)
     return key_couples
 
 
 def find_triple_intersections(rays1, rays2, rays3, width, height):
     points = []
     min_dist = 0.1
-    for ray1 in tqdm(rays1):
-        for ray2 in rays2:
-            for ray3 in rays3:
-                p = center_of_three_parallel_pairs(ray1['rays'][0], ray1['rays'][1], ray2['rays'][0], ray2['rays'][1], ray3['rays'][0], ray3['rays'][1])
-                if p:
-                    if p[0] > -1*min_dist and p[1] > -1*min_dist and p[0] < width + min_dist and p[1] < height + min_dist:
-                        points.append({'rays': [ray1['rays'], ray2['rays'], ray3['rays']], 'mesure':[ray1['mesure'], ray2['mesure'], ray3['mesure']], 'point': p})
+    if not (rays1 and rays2 and rays3):
+        return points
+    strips = [np.array([ray['rays'] for ray in rays], dtype=float) for rays in (rays1, rays2, rays3)]
+    bounds = (-1*min_dist, -1*min_dist, width + min_dist, height + min_dist)
+    triples, centers = find_strip_triples(*strips, bounds)
+    for (i, j, k), p in zip(triples.tolist(), centers.tolist()):
+        ray1, ray2, ray3 = rays1[i], rays2[j], rays3[k]
+        points.append({'rays': [ray1['rays'], ray2['rays'], ray3['rays']], 'mesure':[ray1['mesure'], ray2['mesure'], ray3['mesure']], 'point': tuple(p)})
     return points
 
 
@@ -83,77 +89,147 @@ def find_direction(k_r1, k_r2, k_l1, k_l2):
 def find_segments(intersections_r: list, intersections_l: list, dist_between_rays):
     all_points = []
 
-    # find non corner points
-    for p1 in intersections_r:
-        for p2 in intersections_l:
-            point1 = Point(p1['point'])
-            point2 = Point(p2['point'])
-            if point1.distance(point2) < 4*dist_between_rays:
-                new_point = ((point1.x+point2.x)/2, (point1.y+point2.y)/2)
-                direction = find_direction(p1['mesure'][0][0], p1['mesure'][0][1], p2['mesure'][0][0], p2['mesure'][0][1])
-                all_points.append({'point': new_point, 'direction': direction})
-                p1['found'] = True
-                p2['found'] = True
-                break
-
-    # find corner points
-    for p in intersections_r:
-        if 'found' not in p.keys():
-            direction = find_direction(p['mesure'][0][0], p['mesure'][0][1], 0, 0)
-            all_points.append({'point': p['point'], 'direction': direction})
-    for p in intersections_l:
-        if 'found' not in p.keys():
-            direction = find_direction(0, 0, p['mesure'][0][0], p['mesure'][0][1])
-            all_points.append({'point': p['point'], 'direction': direction})
+    with instrumentation.timer('merging'):
+        # find non corner points
+        for p1 in intersections_r:
+            for p2 in intersections_l:
+                point1 = Point(p1['point'])
+                point2 = Point(p2['point'])
+                if point1.distance(point2) < 4*dist_between_rays:
+                    new_point = ((point1.x+point2.x)/2, (point1.y+point2.y)/2)
+                    direction = find_direction(p1['mesure'][0][0], p1['mesure'][0][1], p2['mesure'][0][0], p2['mesure'][0][1])
+                    all_points.append({'point': new_point, 'direction': direction})
+                    p1['found'] = True
+                    p2['found'] = True
+                    break
+
+        # find corner points
+        for p in intersections_r:
+            if 'found' not in p.keys():
+                direction = find_direction(p['mesure'][0][0], p['mesure'][0][1], 0, 0)
+                all_points.append({'point': p['point'], 'direction': direction})
+        for p in intersections_l:
+            if 'found' not in p.keys():
+                direction = find_direction(0, 0, p['mesure'][0][0], p['mesure'][0][1])
+                all_points.append({'point': p['point'], 'direction': direction})
 
     # find segments using directions
+    instrumentation.count('candidate_points', len(all_points))
     segments = []
-    for i in range(len(all_points) - 1):
-        for j in range(i+1, len(all_points)):
-            if abs(all_points[i]['point'][0] - all_points[j]['point'][0]) < 4*dist_between_rays:
-                if (all_points[i]['direction']['up'] and all_points[j]['direction']['down']
-                    or all_points[i]['direction']['down'] and all_points[j]['direction']['up']):
-                    segments.append([all_points[i]['point'], all_points[j]['point']])
-            elif abs(all_points[i]['point'][1] - all_points[j]['point'][1]) < 4*dist_between_rays:
-                if (all_points[i]['direction']['left'] and all_points[j]['direction']['right']
-                    or all_points[i]['direction']['right'] and all_points[j]['direction']['left']):
-                    segments.append([all_points[i]['point'], all_points[j]['point']])
+    with instrumentation.timer('pairing'):
+        for i in range(len(all_points) - 1):
+            for j in range(i+1, len(all_points)):
+                if abs(all_points[i]['point'][0] - all_points[j]['point'][0]) < 4*dist_between_rays:
+                    if (all_points[i]['direction']['up'] and all_points[j]['direction']['down']
+                        or all_points[i]['direction']['down'] and all_points[j]['direction']['up']):
+                        segments.append([all_points[i]['point'], all_points[j]['point']])
+                elif abs(all_points[i]['point'][1] - all_points[j]['point'][1]) < 4*dist_between_rays:
+                    if (all_points[i]['direction']['left'] and all_points[j]['direction']['right']
+                        or all_points[i]['direction']['right'] and all_points[j]['direction']['left']):
+                        segments.append([all_points[i]['point'], all_points[j]['point']])
 
     return segments
 
-def reconstract_building(building: StraitBuilding, present_results=False):
+def create_all_rays(building: StraitBuilding):
+    """
+    returns: dist_between_rays, the six angles to mesure (three right, three
+        left of the vertical) and their rays
+    """
     # we assume one wall every 4 meters 
     estimated_num_of_walls = int(building.width * building.height / 9)
     # this will return the distance between each ray we want to mesure
     dist_between_rays = calculate_dist(building.width, building.height, estimated_num_of_walls, 0.99)
 
     # define the angles to mesure
-    right_rays1 = create_rays(building.width, building.height, dist_between_rays=dist_between_rays ,angle=math.pi / 2 - math.pi/18)
-    right_rays2 = create_rays(building.width, building.height, dist_between_rays=dist_between_rays ,angle=math.pi / 2 - math.pi/9)
-    right_rays3 = create_rays(building.width, building.height, dist_between_rays=dist_between_rays ,angle=math.pi / 2 - math.pi/6)
-    left_rays1 = create_rays(building.width, building.height, dist_between_rays=dist_between_rays ,angle=math.pi / 2 + math.pi/18)
-    left_rays2 = create_rays(building.width, building.height, dist_between_rays=dist_between_rays ,angle=math.pi / 2 + math.pi/9)
-    left_rays3 = create_rays(building.width, building.height, dist_between_rays=dist_between_rays ,angle=math.pi / 2 + math.pi/6)
-
-    # find the k-visibility for each angle
-    inputs = [(right_rays1, building), (right_rays2, building), (right_rays3, building), (left_rays1, building), (left_rays2, building), (left_rays3, building)]
-    with Pool(processes=6) as pool:
-        mesurements = pool.starmap(get_angle_mesurements, inputs)
-    
-    right_key_rays1 = find_key_rays(right_rays1, mesurements[0])
-    right_key_rays2 = find_key_rays(right_rays2, mesurements[1])
-    right_key_rays3 = find_key_rays(right_rays3, mesurements[2])
-    left_key_rays1 = find_key_rays(left_rays1, mesurements[3])
-    left_key_rays2 = find_key_rays(left_rays2, mesurements[4])
-    left_key_rays3 = find_key_rays(left_rays3, mesurements[5])
+    angles = [math.pi / 2 - math.pi/18, math.pi / 2 - math.pi/9, math.pi / 2 - math.pi/6,
+              math.pi / 2 + math.pi/18, math.pi / 2 + math.pi/9, math.pi / 2 + math.pi/6]
+    all_rays = [create_rays(building.width, building.height, dist_between_rays=dist_between_rays, angle=angle) for angle in angles]
+    return dist_between_rays, angles, all_rays
+
+def find_segments_from_key_rays(key_rays, width, height, dist_between_rays):
+    right_key_rays1, right_key_rays2, right_key_rays3, left_key_rays1, left_key_rays2, left_key_rays3 = key_rays
 
     # assert(len(right_key_rays1) == len(right_key_rays2)
     #        and len(right_key_rays2) == len(right_key_rays3)
     #        and len(left_key_rays1) == len(left_key_rays2)
     #        and len(left_key_rays2) == len(left_key_rays3))
-    intersections_r = find_triple_intersections(right_key_rays1, right_key_rays2, right_key_rays3, building.width, building.height)
-    intersections_l = find_triple_intersections(left_key_rays1, left_key_rays2, left_key_rays3, building.width, building.height)
-    segments = find_segments(intersections_r, intersections_l, dist_between_rays)
+    with instrumentation.timer('triple_intersections'):
+        intersections_r = find_triple_intersections(right_key_rays1, right_key_rays2, right_key_rays3, width, height)
+        intersections_l = find_triple_intersections(left_key_rays1, left_key_rays2, left_key_rays3, width, height)
+    instrumentation.count('intersections', len(intersections_r) + len(intersections_l))
+    return find_segments(intersections_r, intersections_l, dist_between_rays)
+
+def record_building_mesurements(building: StraitBuilding, path, processes=None):
+    # measure the six angles of reconstract_building and save them in the binary format of tools.measurement_io
+    dist_between_rays, angles, all_rays = create_all_rays(building)
+    mesurements = MeasurementExecutor(building.segments, processes).measure(all_rays, 'sweep')
+    records = [record_for_angle(building.width, building.height, angle, dist_between_rays, mesure)
+               for angle, mesure in zip(angles, mesurements)]
+    write_measurements(path, records)
+
+def reconstract_from_record(path):
+    # reconstract a building from a file written by record_building_mesurements, without the building
+    records = read_measurements(path)
+    key_rays = [find_key_rays(record.rays, record.mesurements) for record in records]
+    return find_segments_from_key_rays(key_rays, records[0].width, records[0].height, records[0].spacing)
+
+def reconstract_building_stream(chunks, width, height):
+    """
+    Streaming version of the key ray and intersection stages of
+    reconstract_building, for measurements arriving as chunks of
+    (angle index, rays, mesurements, is_last) with the angles of
+    create_all_rays (see tools.streaming).
+    yields: ((0, 1, 2), right intersections) and ((3, 4, 5), left
+        intersections), each as soon as its three angles are measured;
+        find_segments(right, left, dist_between_rays) finishes the reconstraction
+    """
+    def find_intersections(rays1, rays2, rays3):
+        return find_triple_intersections(rays1, rays2, rays3, width, height)
+    yield from stream_triple_intersections(chunks, [(0, 1, 2), (3, 4, 5)], find_intersections)
+
+def reconstract_building(building: StraitBuilding, present_results=False, key_rays_mode='dense', processes=None,
+                         collect_metrics=False, coarse_stride=8, check_samples=0):
+    """
+    returns: the reconstracted segments, or (segments, metrics) with
+        collect_metrics, metrics being the stage timers, counters and values
+        of tools.instrumentation as a dict
+
+    key_rays_mode: 'dense' measures every ray, 'events' only the rays next to
+        projected wall endpoints, and 'adaptive' every coarse_stride-th ray,
+        bisecting where the count changes (coarse_stride=1 is the dense scan)
+    check_samples: number of random rays per angle the 'events' and
+        'adaptive' modes measure to validate their key rays, a ValueError is
+        raised if one disagrees
+    """
+    if collect_metrics:
+        with instrumentation.collect() as metrics:
+            segments = reconstract_building(building, present_results, key_rays_mode, processes,
+                                            coarse_stride=coarse_stride, check_samples=check_samples)
+        return segments, metrics.as_dict()
+
+    if key_rays_mode not in ('events', 'adaptive', 'dense'):
+        raise ValueError(f"Unknown key rays mode: {key_rays_mode}")
+    with instrumentation.timer('ray_creation'):
+        dist_between_rays, _, all_rays = create_all_rays(building)
+    instrumentation.record('dist_between_rays', dist_between_rays)
+    if key_rays_mode == 'events':
+        # measure only the rays next to projected wall endpoints
+        with instrumentation.timer('key_rays'):
+            key_rays = [find_key_rays_from_events(rays, building.segments, check_samples) for rays in all_rays]
+    elif key_rays_mode == 'adaptive':
+        # measure coarsely and refine only the intervals where the count changes
+        with instrumentation.timer('key_rays'):
+            key_rays = [find_key_rays_adaptive(rays, building.segments, coarse_stride, check_samples)
+                        for rays in all_rays]
+    else:
+        # find the k-visibility for each angle
+        with instrumentation.timer('measurement'):
+            mesurements = MeasurementExecutor(building.segments, processes).measure(all_rays, 'sweep')
+        with instrumentation.timer('key_rays'):
+            key_rays = [find_key_rays(rays, mesure) for rays, mesure in zip(all_rays, mesurements)]
+    instrumentation.count('key_rays', sum(len(rays) for rays in key_rays))
+    segments = find_segments_from_key_rays(key_rays, building.width, building.height, dist_between_rays)
+    instrumentation.count('accepted_segments', len(segments))
     if present_results:
         present_segments([building.segments, segments], side_by_side=True, same_scale=False)
         # present_segments([segments])
@@ -4,7 +4,8 @@ if workspace_root not in sys.path:
     sys.path.insert(0, workspace_root)
 
 import random
-from tools.geometric import point_to_line_dist, lines_are_overlap
+from tools.geometric import segment_point_dist, segments_overlap, SegmentGrid
+from tools.segment_array import SegmentArray
 from tools.segment_presentation import present_segments
 
 class StraitBuilding():
@@ -12,11 +13,44 @@ class StraitBuilding():
         self.width = width
         self.height = height
         self.min_wall_length = min_wall_length
-        # Avoid using a mutable default argument. Create a fresh list per instance.
-        self.segments = list(segments) if segments is not None else []
-        self.horizontal_segments = []
-        self.vertical_segments = []
-        self.frame_segments = []
+        # Walls are kept in a SegmentArray, flagged as horizontal, vertical or frame walls.
+        self.segments = segments if segments is not None else []
+        self._grid = None
+
+    @property
+    def segments(self):
+        return self._segments
+
+    @segments.setter
+    def segments(self, segments):
+        # a plain list of walls is wrapped, with the flags their direction gives
+        if not isinstance(segments, SegmentArray):
+            segments = list(segments)
+            segments = SegmentArray(segments, [self._wall_flags(seg) for seg in segments])
+        self._segments = segments
+
+    def _wall_flags(self, seg):
+        (x1, y1), (x2, y2) = seg
+        flags = 0
+        if x1 == x2 in (0, self.width) or y1 == y2 in (0, self.height):
+            flags |= SegmentArray.FRAME
+        if y1 == y2:
+            flags |= SegmentArray.HORIZONTAL
+        if x1 == x2:
+            flags |= SegmentArray.VERTICAL
+        return flags
+
+    @property
+    def horizontal_segments(self):
+        return self.segments.select(SegmentArray.HORIZONTAL)
+
+    @property
+    def vertical_segments(self):
+        return self.segments.select(SegmentArray.VERTICAL)
+
+    @property
+    def frame_segments(self):
+        return self.segments.select(SegmentArray.FRAME)
 
     def create_random_building(self, num_of_segments):
             
@@ -29,10 +63,15 @@ class StraitBuilding():
                 self.add_rand_corner_seg()
     
     def add_rand_corner_seg(self):
-        seg_to_connect = random.choice(self.segments)
+        idx = random.randrange(len(self.segments))
+        seg_to_connect = self.segments[idx]
+        connect_flags = self.segments.flags[idx]
         point_to_connect = random.choice(seg_to_connect)
         reverse = False
-        if seg_to_connect in self.horizontal_segments:
+        if connect_flags & SegmentArray.FRAME:
+            # walls are not connected to the frame
+            return
+        elif connect_flags & SegmentArray.HORIZONTAL:
             h = random.uniform(self.min_wall_length, self.height/2)
             x2 = point_to_connect[0]
             if random.random() < 0.5:
@@ -40,7 +79,7 @@ class StraitBuilding():
             else:
                 y2 = max(point_to_connect[1] - h, 0)
                 reverse = True 
-        elif seg_to_connect in self.vertical_segments:
+        elif connect_flags & SegmentArray.VERTICAL:
             w = random.uniform(self.min_wall_length, self.width/2)
             y2 = point_to_connect[1]
             if random.random() < 0.5:
@@ -55,11 +94,10 @@ class StraitBuilding():
         else:
             new_segment = [point_to_connect, (x2,y2)]
         if (self.seg_legal_check(new_segment)):
-            self.segments.append(new_segment)
-            if seg_to_connect in self.horizontal_segments:
-                self.vertical_segments.append(new_segment)
+            if connect_flags & SegmentArray.HORIZONTAL:
+                self.segments.append(new_segment, SegmentArray.VERTICAL)
             else:
-                self.horizontal_segments.append(new_segment)
+                self.segments.append(new_segment, SegmentArray.HORIZONTAL)
          
     def add_rand_seg(self):
         is_horizontal = random.random() < 0.5
@@ -78,34 +116,33 @@ class StraitBuilding():
         new_segment = [(x1, y1), (x2, y2)]
         
         if (self.seg_legal_check(new_segment)):
-            self.segments.append(new_segment)
             if is_horizontal:
-                self.horizontal_segments.append(new_segment)
+                self.segments.append(new_segment, SegmentArray.HORIZONTAL)
             else:
-                self.vertical_segments.append(new_segment)
+                self.segments.append(new_segment, SegmentArray.VERTICAL)
     
     def add_frame(self):
-        self.segments.append([(0,0), (self.width, 0)])
-        self.frame_segments.append([(0,0), (self.width, 0)])
-        self.segments.append([(self.width, 0), (self.width, self.height)])
-        self.frame_segments.append([(self.width, 0), (self.width, self.height)])
-        self.segments.append([(self.width, self.height), (0,self.height)])
-        self.frame_segments.append([(self.width, self.height), (0,self.height)])
-        self.segments.append([(0,self.height), (0,0)])
-        self.frame_segments.append([(0,self.height), (0,0)])
+        self.segments.append([(0,0), (self.width, 0)], SegmentArray.FRAME)
+        self.segments.append([(self.width, 0), (self.width, self.height)], SegmentArray.FRAME)
+        self.segments.append([(self.width, self.height), (0,self.height)], SegmentArray.FRAME)
+        self.segments.append([(0,self.height), (0,0)], SegmentArray.FRAME)
 
     def seg_legal_check(self, new_segment):
         # check if segment is not too close to another segment, or overlaps
-        for seg in self.segments:
-            if ((point_to_line_dist(seg[0], new_segment) < self.min_wall_length
-                and point_to_line_dist(seg[0], new_segment) != 0)
-                or (point_to_line_dist(seg[1], new_segment) < self.min_wall_length 
-                and point_to_line_dist(seg[1], new_segment) != 0)
-                or (point_to_line_dist(new_segment[0], seg) < self.min_wall_length 
-                and point_to_line_dist(new_segment[0], seg) != 0)
-                or (point_to_line_dist(new_segment[1], seg) < self.min_wall_length
-                and point_to_line_dist(new_segment[1], seg) != 0)
-                or lines_are_overlap(seg, new_segment)):
+        # the grid is kept between checks, so only the new walls are indexed
+        cell_size = max(self.min_wall_length, max(self.width, self.height) / 64)
+        if self._grid is None or self._grid.cell_size != cell_size:
+            self._grid = SegmentGrid(cell_size)
+        for seg in self._grid.sync(self.segments).query(new_segment, self.min_wall_length):
+            if ((segment_point_dist(seg[0], new_segment) < self.min_wall_length
+                and segment_point_dist(seg[0], new_segment) != 0)
+                or (segment_point_dist(seg[1], new_segment) < self.min_wall_length 
+                and segment_point_dist(seg[1], new_segment) != 0)
+                or (segment_point_dist(new_segment[0], seg) < self.min_wall_length 
+                and segment_point_dist(new_segment[0], seg) != 0)
+                or (segment_point_dist(new_segment[1], seg) < self.min_wall_length
+                and segment_point_dist(new_segment[1], seg) != 0)
+                or segments_overlap(seg, new_segment)):
                     return False
         return True
     
@@ -0,0 +1,14 @@
+"""
+Makes the workspace importable for the tests, and for the benchmarks that
+import it: the workspace root for the packages, and the directory of every
+building family, since the algorithm modules import their building module
+by its bare name (e.g. `from strait_building import StraitBuilding`).
+"""
+import sys, os
+
+workspace_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAMILIES = ('strait_building_reconstraction', 'any_building_reconstraction', 'grid_building_reconstraction')
+
+for path in [workspace_root] + [os.path.join(workspace_root, family) for family in FAMILIES]:
+    if path not in sys.path:
+        sys.path.insert(0, path)
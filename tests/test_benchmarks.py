@@ -0,0 +1,19 @@
+import json
+from benchmarks.run_benchmarks import DEFAULT_BASELINES, PRESETS, compare, config_key
+
+def test_quick_baseline_covers_preset():
+    with open(DEFAULT_BASELINES['quick']) as f:
+        baseline = json.load(f)
+    assert {config_key(result) for result in baseline['results']} == set(PRESETS['quick'])
+    for result in baseline['results']:
+        if result['family'] == 'strait':
+            assert {'merging', 'pairing'} <= set(result['stages'])
+
+def test_compare_flags_only_slow_stages():
+    with open(DEFAULT_BASELINES['quick']) as f:
+        baseline = json.load(f)
+    assert not any(row[-1] for row in compare(baseline['results'], baseline, 1.25))
+    slower = [dict(result, stages={name: seconds * 2 + 0.01 for name, seconds in result['stages'].items()})
+              for result in baseline['results']]
+    rows = compare(slower, baseline, 1.25)
+    assert all(regression for _, stage, _, _, _, regression in rows if stage != 'total')
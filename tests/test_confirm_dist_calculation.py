@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+from tools.confirm_dist_calculation import exact_prob, find_dist, find_prob
+
+@pytest.mark.parametrize('width, height', [(8, 10), (10, 8), (1, 1), (100, 30)])
+@pytest.mark.parametrize('num_of_values', [2, 3, 10, 50])
+@pytest.mark.parametrize('min_prob', [0.5, 0.9, 0.99])
+def test_find_dist_inverts_exact_prob(width, height, num_of_values, min_prob):
+    dist = find_dist(width, height, num_of_values, min_prob)
+    assert exact_prob(min(width, height), num_of_values, dist) == pytest.approx(min_prob, rel=1e-9)
+
+def test_find_dist_single_value():
+    assert find_dist(8, 10, 1, 0.99) == 8
+    assert exact_prob(8, 1, 8) == 1.0
+
+def test_find_prob_estimates_exact_prob():
+    estimate = find_prob(10, 5, 0.5, trials=200000, rng=np.random.default_rng(0))
+    assert estimate == pytest.approx(exact_prob(10, 5, 0.5), abs=0.01)
@@ -0,0 +1,18 @@
+import pytest
+from tools.corpus import corpus_specs, generate_building
+
+def test_any_generation_gives_up_after_max_restarts():
+    # the points fit in 6x6, but 20 walls 1 apart do not
+    spec = {'family': 'any', 'seed': 0, 'width': 6, 'height': 6, 'num_of_segments': 20}
+    with pytest.raises(ValueError, match='in 2 restarts'):
+        generate_building(spec, max_restarts=2)
+
+def test_any_generation_is_seeded():
+    spec = corpus_specs('any', 1, 3, 8, 10, num_of_segments=10)[0]
+    assert list(generate_building(spec).segments) == list(generate_building(spec).segments)
+
+@pytest.mark.parametrize('prob, num_of_segments', [(0, 4), (1, 10 + 12)])
+def test_grid_generation_uses_the_spec_fill(prob, num_of_segments):
+    # an empty grid is only the frame, a full one has a wall along every row and column
+    spec = corpus_specs('grid', 1, 0, 9, 11, prob=prob)[0]
+    assert len(generate_building(spec).segments) == num_of_segments
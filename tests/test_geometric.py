@@ -0,0 +1,80 @@
+import math
+import random
+import numpy as np
+import pytest
+from tools.geometric import centers_of_three_parallel_pairs, find_strip_triples, poisson_disk_sample
+
+def _family(rng, angle, num_of_strips, width=0.3):
+    # strips of random offsets and widths along the direction of angle, long enough to span the box
+    direction = np.array([math.cos(angle), math.sin(angle)])
+    normal = np.array([-direction[1], direction[0]])
+    strips = []
+    for offset in np.sort(rng.uniform(-15, 15, num_of_strips)):
+        lines = []
+        for c in (offset, offset + rng.uniform(0.01, width)):
+            lines.append([c*normal - 30*direction, c*normal + 30*direction])
+        strips.append(lines)
+    return np.array(strips)
+
+def _every_triple(families, bounds):
+    i, j, k = [a.ravel() for a in np.meshgrid(*[np.arange(len(f)) for f in families], indexing='ij')]
+    centers = centers_of_three_parallel_pairs(families[0][i], families[1][j], families[2][k])
+    xmin, ymin, xmax, ymax = bounds
+    keep = ~np.isnan(centers[:, 0])
+    keep &= (centers[:, 0] > xmin) & (centers[:, 1] > ymin) & (centers[:, 0] < xmax) & (centers[:, 1] < ymax)
+    return np.stack([i, j, k], axis=1)[keep], centers[keep]
+
+@pytest.mark.parametrize('seed', range(10))
+def test_find_strip_triples_matches_every_triple(seed):
+    rng = np.random.default_rng(seed)
+    angles = rng.uniform(0, math.pi, 3)
+    families = [_family(rng, angle, 25) for angle in angles]
+    bounds = (0, 0, 8, 10)
+    expected_triples, expected_centers = _every_triple(families, bounds)
+    triples, centers = find_strip_triples(*families, bounds, chunk_size=7)
+    assert triples.tolist() == expected_triples.tolist()
+    assert np.allclose(centers, expected_centers)
+
+def test_find_strip_triples_skips_parallel_families():
+    rng = np.random.default_rng(0)
+    families = [_family(rng, 0.3, 10), _family(rng, 0.3, 10), _family(rng, 1.2, 10)]
+    triples, centers = find_strip_triples(*families, (0, 0, 8, 10))
+    assert triples.shape == (0, 3) and centers.shape == (0, 2)
+
+class CountingRandom():
+    # counts random() calls, which only the Bridson fallback makes
+    def __init__(self, seed):
+        self._rng = random.Random(seed)
+        self.calls = 0
+
+    def uniform(self, a, b):
+        return self._rng.uniform(a, b)
+
+    def random(self):
+        self.calls += 1
+        return self._rng.random()
+
+def assert_poisson_disk(points, width, height, min_dist):
+    coords = np.array(points)
+    assert ((coords >= 0) & (coords <= (width, height))).all()
+    dists = np.hypot(*(coords[:, None] - coords[None]).transpose(2, 0, 1))
+    assert dists[np.triu_indices(len(points), 1)].min() >= min_dist
+
+def test_poisson_sparse_request_is_spread_without_fallback():
+    rng = CountingRandom(1)
+    points = poisson_disk_sample(100, 100, 1, 20, rng)
+    assert len(points) == 20 and rng.calls == 0
+    assert_poisson_disk(points, 100, 100, 1)
+    # Bridson alone would pack them within a few min_dist of its first point
+    assert np.ptp(np.array(points), axis=0).min() > 50
+
+def test_poisson_crowded_request_falls_back_to_bridson():
+    rng = CountingRandom(0)
+    # the uniform throws place fewer than 70 points a unit apart in 10x10
+    points = poisson_disk_sample(10, 10, 1, 70, rng)
+    assert len(points) == 70 and rng.calls > 0
+    assert_poisson_disk(points, 10, 10, 1)
+
+def test_poisson_reports_infeasible_density():
+    with pytest.raises(ValueError):
+        poisson_disk_sample(10, 10, 1, 200, random.Random(3))
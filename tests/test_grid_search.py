@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from building import GridBuilding
+from grid_building_reconstraction import grid_search_algorithm as grid_algorithm
+
+def test_pair_open_close_rejects_close_without_open():
+    opens = np.zeros((2, 4), dtype=bool)
+    closes = np.zeros((2, 4), dtype=bool)
+    opens[0, 1] = closes[0, 3] = True
+    rows, open_cols, close_cols = grid_algorithm._pair_open_close(opens, closes)
+    assert (rows.tolist(), open_cols.tolist(), close_cols.tolist()) == ([0], [1], [3])
+    # the open of row 0 can not close row 1
+    closes[1, 0] = True
+    with pytest.raises(ValueError):
+        grid_algorithm._pair_open_close(opens, closes)
+
+def _random_grid(seed):
+    rng = np.random.default_rng(seed)
+    building = GridBuilding(int(rng.integers(2, 9)), int(rng.integers(2, 9)), rng=rng)
+    building.fill_grid_randomly(0.4)
+    return building
+
+@pytest.mark.parametrize('seed', range(20))
+def test_grid_mesurements_match_shapely(seed):
+    building = _random_grid(seed)
+    right_angle_rays, left_angle_rays = grid_algorithm.create_angled_rays(building.width, building.height)
+    expected = grid_algorithm.get_angle_mesurements(right_angle_rays, left_angle_rays, building)
+    assert grid_algorithm.get_grid_mesurements(building) == expected
+
+@pytest.mark.parametrize('seed', range(20))
+def test_find_segments_from_arrays_matches_find_segments(seed):
+    building = _random_grid(seed)
+    width, height = building.width, building.height
+    right, left = grid_algorithm.get_grid_mesurements(building)
+    points_directions = grid_algorithm.find_points_direction(right, left, width, height)
+    expected = grid_algorithm.find_segments(points_directions, width, height, right, left)
+    directions = grid_algorithm.find_points_direction_arrays(right, left, width, height)
+    for key in ('up', 'down', 'left', 'right'):
+        assert directions[key].tolist() == [[direction[key] for direction in column] for column in points_directions]
+    assert grid_algorithm.find_segments_from_arrays(directions) == expected
+    assert sorted(expected) == sorted(building.segments)
@@ -0,0 +1,55 @@
+import random
+import pytest
+from tools.k_visibility import SegmentIndex, count_crossings_batch, count_crossings_sweep, find_key_ray_events_adaptive
+
+# vertical rays at x = 0.5, 1.5, ..., 15.5 and a wall only the third one crosses
+RAYS = [((i + 0.5, 0), (i + 0.5, 10)) for i in range(16)]
+SHORT_WALL = [((2.1, 5), (2.9, 5))]
+
+def test_adaptive_stride_one_finds_every_change():
+    events, num_of_measured = find_key_ray_events_adaptive(RAYS, SHORT_WALL, coarse_stride=1)
+    assert events == [(1, 0, 1), (2, 1, 0)]
+    assert num_of_measured == len(RAYS)
+
+def test_adaptive_check_samples_detects_missed_change():
+    events, _ = find_key_ray_events_adaptive(RAYS, SHORT_WALL, coarse_stride=8)
+    assert events == []
+    with pytest.raises(ValueError):
+        find_key_ray_events_adaptive(RAYS, SHORT_WALL, coarse_stride=8, check_samples=len(RAYS), rng=random.Random(0))
+    # the samples agree with what was found
+    find_key_ray_events_adaptive(RAYS, SHORT_WALL, coarse_stride=1, check_samples=len(RAYS), rng=random.Random(0))
+
+def _lattice_segments(rng, n, size=6):
+    segments = []
+    while len(segments) < n:
+        p = tuple(rng.randint(0, size) for _ in range(2))
+        q = tuple(rng.randint(0, size) for _ in range(2))
+        if p != q:
+            segments.append((p, q))
+    return segments
+
+@pytest.mark.parametrize('seed', range(20))
+def test_count_crossings_batch_matches_segment_index(seed):
+    # lattice walls and rays meet in colinear overlaps, endpoint touches and
+    # equal walls, where the -1 sentinel and the skipping rules matter
+    rng = random.Random(seed)
+    walls = _lattice_segments(rng, 8)
+    (x1, y1), (x2, y2) = walls[5]
+    overlapping = ((x1, y1), (2*x2 - x1, 2*y2 - y1))
+    rays = _lattice_segments(rng, 40) + walls[:3] + [(q, p) for p, q in walls[3:5]] + [overlapping]
+    index = SegmentIndex(walls)
+    expected = [index.count_crossings(ray) for ray in rays]
+    assert count_crossings_batch(rays, walls).tolist() == expected
+    assert count_crossings_batch(rays, walls, chunk_size=7).tolist() == expected
+    assert expected[-1] == -1
+
+@pytest.mark.parametrize('seed', range(20))
+def test_count_crossings_sweep_matches_segment_index(seed):
+    # parallel rays through lattice points, long enough to span every wall
+    rng = random.Random(seed)
+    walls = _lattice_segments(rng, 8)
+    dx, dy = rng.choice([(1, 0), (0, 1), (1, 1), (1, -1), (1, 2), (2, -1), (3, 1)])
+    rays = [((x - 20*dx, y - 20*dy), (x + 20*dx, y + 20*dy)) for x in range(-1, 8) for y in range(-1, 8)]
+    index = SegmentIndex(walls)
+    expected = [index.count_crossings(ray) for ray in rays]
+    assert count_crossings_sweep(rays, walls).tolist() == expected
@@ -0,0 +1,48 @@
+import math
+import random
+import pytest
+from any_building_reconstraction.reconstraction_algorithm import create_rays, find_key_rays
+from tools.k_visibility import count_crossings_sweep
+from tools.measurement_cache import MeasurementCache
+
+FRAME = [((0, 0), (8, 0)), ((8, 0), (8, 10)), ((8, 10), (0, 10)), ((0, 10), (0, 0))]
+
+def _random_wall(rng):
+    return ((rng.uniform(0, 8), rng.uniform(0, 10)), (rng.uniform(0, 8), rng.uniform(0, 10)))
+
+def _assert_up_to_date(cache):
+    for rays, mesure, key_rays in zip(cache.ray_families, cache.mesurements, cache.key_rays):
+        expected = count_crossings_sweep(rays, cache.walls)
+        assert mesure.tolist() == expected.tolist()
+        assert key_rays == find_key_rays(rays, expected)
+
+@pytest.mark.parametrize('seed', range(5))
+def test_cache_follows_wall_edits(seed):
+    rng = random.Random(seed)
+    families = [create_rays(8, 10, 0.05, i * math.pi / 5) for i in range(5)]
+    cache = MeasurementCache(families, FRAME)
+    _assert_up_to_date(cache)
+    walls = []
+    for _ in range(10):
+        walls.append(_random_wall(rng))
+        cache.add_wall(walls[-1])
+        _assert_up_to_date(cache)
+    # a wall on a ray of the vertical family (angle 0) turns it into -1
+    x = families[0][41][0][0]
+    cache.add_wall(((x, 1), (x, 4)))
+    assert cache.mesurements[0][41] == -1
+    _assert_up_to_date(cache)
+    for _ in range(5):
+        wall = walls.pop(rng.randrange(len(walls)))
+        new_wall = _random_wall(rng)
+        cache.move_wall(wall, new_wall)
+        walls.append(new_wall)
+        _assert_up_to_date(cache)
+    for wall in walls[:6] + [((x, 1), (x, 4))]:
+        cache.remove_wall(wall)
+        _assert_up_to_date(cache)
+
+def test_cache_remove_missing_wall():
+    cache = MeasurementCache([create_rays(8, 10, 0.05, math.pi / 2)], FRAME)
+    with pytest.raises(ValueError):
+        cache.remove_wall(((1, 1), (2, 2)))
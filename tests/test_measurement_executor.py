@@ -0,0 +1,30 @@
+import numpy as np
+from tools import instrumentation, measurement_executor
+from tools.measurement_executor import MeasurementExecutor
+
+# 30 random walls and 8000 random rays, above the batch break-even on two cpus
+rng = np.random.default_rng(9)
+WALLS = rng.uniform(0, 20, size=(30, 2, 2))
+RAYS = rng.uniform(-5, 25, size=(8000, 2, 2))
+
+def test_default_batch_runs_on_pool(monkeypatch):
+    monkeypatch.setattr(measurement_executor.os, 'cpu_count', lambda: 2)
+    executor = MeasurementExecutor(WALLS)
+    assert executor.estimate_seconds('batch', len(RAYS), 2) < executor.estimate_seconds('batch', len(RAYS), 1)
+    with instrumentation.collect() as metrics:
+        pooled = executor.measure([RAYS], 'batch')
+    assert metrics.counters['pool_tasks'] > 0
+    assert pooled == MeasurementExecutor(WALLS, processes=1).measure([RAYS], 'batch')
+
+def test_default_sweep_stays_in_process(monkeypatch):
+    monkeypatch.setattr(measurement_executor.os, 'cpu_count', lambda: 8)
+    parallel = [((x, -1), (x, 21)) for x in np.linspace(0, 20, 100000)]
+    with instrumentation.collect() as metrics:
+        MeasurementExecutor(WALLS).measure([parallel], 'sweep')
+    assert 'pool_tasks' not in metrics.counters
+
+def test_single_cpu_never_starts_pool(monkeypatch):
+    monkeypatch.setattr(measurement_executor.os, 'cpu_count', lambda: 1)
+    with instrumentation.collect() as metrics:
+        MeasurementExecutor(WALLS).measure([RAYS], 'batch')
+    assert 'pool_tasks' not in metrics.counters
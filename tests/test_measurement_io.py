@@ -0,0 +1,44 @@
+import math
+import numpy as np
+import pytest
+from any_building_reconstraction import reconstraction_algorithm as any_algorithm
+from strait_building_reconstraction import reconstraction_algorithm as strait_algorithm
+from tools.corpus import corpus_specs, generate_building
+from tools.measurement_io import MeasurementRecord, read_measurements, record_for_angle, write_measurements
+
+def test_measurements_round_trip(tmp_path):
+    rng = np.random.default_rng(0)
+    records = [MeasurementRecord(angle, 0.01, 1.5, -2.25, 8, 10, rng.integers(-1, 30, size=count))
+               for angle, count in ((0.3, 1000), (1.2, 0), (2.5, 17))]
+    path = tmp_path / 'building.kvis'
+    write_measurements(path, records)
+    read_records = read_measurements(path)
+    assert len(read_records) == len(records)
+    for record, read in zip(records, read_records):
+        assert (read.angle, read.spacing, read.origin_shift, read.ray_shift) == (record.angle, 0.01, 1.5, -2.25)
+        assert (read.width, read.height) == (8, 10)
+        assert np.asarray(read.mesurements).tolist() == record.mesurements.tolist()
+
+def test_read_rejects_other_files(tmp_path):
+    path = tmp_path / 'other.bin'
+    path.write_bytes(b'not a measurement file at all, just some bytes')
+    with pytest.raises(ValueError):
+        read_measurements(path)
+
+@pytest.mark.parametrize('algorithm, angles', [
+    (strait_algorithm, [math.pi/2 + sign*math.pi/k for sign in (-1, 1) for k in (18, 9, 6)]),
+    (any_algorithm, [i * math.pi / 9 for i in range(9)]),
+], ids=['strait', 'any'])
+def test_record_rays_match_create_rays(algorithm, angles):
+    for angle in angles:
+        rays = algorithm.create_rays(8, 10, 0.05, angle)
+        record = record_for_angle(8, 10, angle, 0.05, np.zeros(len(rays), dtype=int))
+        assert list(record.rays) == rays
+        assert np.array_equal(np.asarray(record.rays), np.asarray(rays, dtype=float))
+
+@pytest.mark.parametrize('spec', corpus_specs('strait', 4, 0, 8, 10, num_of_segments=14), ids=lambda spec: f"seed{spec['seed']}")
+def test_reconstract_from_record_matches_reconstract_building(spec, tmp_path):
+    building = generate_building(spec)
+    path = tmp_path / 'building.kvis'
+    strait_algorithm.record_building_mesurements(building, path, processes=1)
+    assert strait_algorithm.reconstract_from_record(path) == strait_algorithm.reconstract_building(building, processes=1)
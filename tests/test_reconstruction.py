@@ -0,0 +1,125 @@
+import json
+import math
+import os
+import random
+import numpy as np
+import pytest
+from any_building import AnyBuilding
+from strait_building import StraitBuilding
+from any_building_reconstraction import reconstraction_algorithm as any_algorithm
+from strait_building_reconstraction import reconstraction_algorithm as strait_algorithm
+from tools.corpus import corpus_specs, generate_building
+from tools.geometric import combine_close_points
+from tools.k_visibility import count_crossings_batch, count_crossings_sweep
+
+def _same_segment(seg, wall, tol):
+    def close(p, q):
+        return abs(p[0] - q[0]) < tol and abs(p[1] - q[1]) < tol
+    return (close(seg[0], wall[0]) and close(seg[1], wall[1])) or (close(seg[0], wall[1]) and close(seg[1], wall[0]))
+
+# Walls (without the frame) of a few seeded buildings and the segments the
+# Shapely based pipelines of the first revision reconstracted from them
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'baseline_segments.json')) as f:
+    BASELINE = json.load(f)
+
+def _building(cls, case):
+    building = cls(case['width'], case['height'])
+    building.add_frame()
+    building.segments.extend(case['walls'])
+    return building
+
+def _reconstract(algorithm, building):
+    return algorithm.reconstract_building(building, processes=1)
+
+@pytest.mark.parametrize('case', BASELINE['strait'])
+def test_strait_reconstraction_matches_baseline(case):
+    segments = _reconstract(strait_algorithm, _building(StraitBuilding, case))
+    assert len(segments) == len(case['segments'])
+    for expected in case['segments']:
+        assert any(_same_segment(seg, expected, 1e-6) for seg in segments), f"{expected} was not reconstracted"
+
+@pytest.mark.parametrize('case', BASELINE['any'])
+def test_any_reconstraction_matches_baseline(case):
+    # find_candidate_pairs skips pairs with an empty ray between them, which
+    # the verification of the first revision accepted, so 'pruned_segments'
+    # is the subset of the baseline 'segments' expected today
+    building = _building(AnyBuilding, case)
+    segments = _reconstract(any_algorithm, building)
+    assert len(segments) == len(case['pruned_segments'])
+    for expected in case['pruned_segments']:
+        assert any(_same_segment(seg, expected, 1e-6) for seg in segments), f"{expected} was not reconstracted"
+    # only phantom segments may be pruned, never a wall the baseline recovered
+    for expected in case['segments']:
+        if any(_same_segment(expected, wall, 0.3) for wall in building.segments):
+            assert any(_same_segment(seg, expected, 1e-6) for seg in segments), f"wall {expected} was lost"
+
+def test_combine_close_points_keeps_first_copy():
+    points = [(0.0, 0.0), (5.0, 5.0), (0.0, 0.0), (0.05, 0.0), (0.0, 0.0)]
+    assert combine_close_points(points, 0.1) == [(0.0, 0.0), (5.0, 5.0)]
+
+@pytest.mark.parametrize('spec', corpus_specs('any', 6, 0, 8, 10, num_of_segments=8), ids=lambda spec: f"seed{spec['seed']}")
+def test_any_reconstraction_keeps_frame_walls(spec):
+    building = generate_building(spec)
+    segments = any_algorithm.reconstract_building(building, processes=1)
+    for wall in building.frame_segments:
+        assert any(_same_segment(seg, wall, 0.3) for seg in segments), f"frame wall {wall} was not reconstracted"
+
+@pytest.mark.parametrize('spec', corpus_specs('any', 8, 0, 8, 10, num_of_segments=10), ids=lambda spec: f"seed{spec['seed']}")
+def test_any_key_rays_modes_agree(spec):
+    building = generate_building(spec)
+    results = []
+    # with coarse_stride=1 the adaptive mode can not miss a change
+    for mode in ('dense', 'events', 'adaptive'):
+        segments = any_algorithm.reconstract_building(building, key_rays_mode=mode, processes=1, coarse_stride=1)
+        results.append(sorted(tuple(map(tuple, seg)) for seg in segments))
+    assert results[0] == results[1] == results[2]
+
+def test_any_reconstraction_of_assigned_segments():
+    # walls assigned as a plain list are wrapped, with the frame walls flagged
+    case = BASELINE['any'][0]
+    building = AnyBuilding(case['width'], case['height'])
+    width, height = case['width'], case['height']
+    building.segments = [((0, 0), (width, 0)), ((width, 0), (width, height)),
+                         ((width, height), (0, height)), ((0, height), (0, 0))] + case['walls']
+    assert len(building.frame_segments) == 4
+    assert len(_reconstract(any_algorithm, building)) == len(case['pruned_segments'])
+
+def _empty_rays(all_rays, mesurements, building):
+    # offsets along the unit normal of the rays that see no wall besides the frame
+    empty_rays = []
+    for rays, mesure in zip(all_rays, mesurements):
+        rays = np.asarray(rays, dtype=float)
+        direction = rays[0, 1] - rays[0, 0]
+        normal = np.array([-direction[1], direction[0]]) / np.hypot(*direction)
+        frame = count_crossings_batch(rays, building.frame_segments)
+        empty = (mesure != -1) & (mesure <= frame)
+        empty_rays.append((normal, rays[empty, 0] @ normal))
+    return empty_rays
+
+@pytest.mark.parametrize('spec', corpus_specs('any', 3, 0, 8, 10, num_of_segments=10), ids=lambda spec: f"seed{spec['seed']}")
+def test_find_candidate_pairs_matches_every_pair_check(spec):
+    building = generate_building(spec)
+    rng = random.Random(spec['seed'])
+    points = [(rng.uniform(0, 8), rng.uniform(0, 10)) for _ in range(25)] + [(0.01, 3), (0.02, 7), (4, 9.99)]
+    dist_between_rays = 0.05
+    all_rays = [any_algorithm.create_rays(8, 10, dist_between_rays, i * math.pi / 9) for i in range(9)]
+    mesurements = [count_crossings_sweep(rays, building.segments) for rays in all_rays]
+    margin = dist_between_rays*4
+    empty_rays = _empty_rays(all_rays, mesurements, building)
+    expected = []
+    for i in range(len(points) - 1):
+        for j in range(i + 1, len(points)):
+            on_frame = any(abs(points[i][axis] - side) < margin and abs(points[j][axis] - side) < margin
+                           for axis, size in ((0, 8), (1, 10)) for side in (0, size))
+            # every ray strictly between the projections, pushed in by margin, must see a wall
+            supported = True
+            for normal, offsets in empty_rays:
+                lo, hi = sorted((np.dot(points[i], normal), np.dot(points[j], normal)))
+                supported &= not ((lo + margin < offsets) & (offsets < hi - margin)).any()
+            if on_frame or supported:
+                expected.append((i, j))
+    assert any_algorithm.find_candidate_pairs(points, all_rays, mesurements, building, dist_between_rays) == expected
+    # the key rays give the same measurements in every mode
+    for rays, mesure in zip(all_rays, mesurements):
+        rebuilt = any_algorithm.mesurements_from_key_rays(len(rays), any_algorithm.find_key_rays(rays, mesure))
+        assert rebuilt.tolist() == mesure.tolist()
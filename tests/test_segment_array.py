@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+from strait_building import StraitBuilding
+from tools.segment_array import SegmentArray
+
+def test_array_protocol_copies():
+    segments = SegmentArray([((0, 0), (1, 0)), ((1, 0), (1, 2))])
+    assert np.shares_memory(np.asarray(segments), segments.coords)
+    assert np.shares_memory(np.array(segments, copy=False), segments.coords)
+    assert not np.shares_memory(np.array(segments, copy=True), segments.coords)
+    assert np.asarray(segments, dtype=np.float32).dtype == np.float32
+    with pytest.raises(ValueError):
+        np.array(segments, dtype=np.float32, copy=False)
+
+def test_assigned_walls_on_the_frame_keep_their_direction():
+    building = StraitBuilding(8, 10)
+    building.segments = [((0, 0), (8, 0)), ((2, 0), (5, 0)), ((8, 3), (8, 6)), ((2, 4), (6, 4)), ((3, 1), (3, 9))]
+    assert building.frame_segments == [((0, 0), (8, 0)), ((2, 0), (5, 0)), ((8, 3), (8, 6))]
+    assert building.horizontal_segments == [((0, 0), (8, 0)), ((2, 0), (5, 0)), ((2, 4), (6, 4))]
+    assert building.vertical_segments == [((8, 3), (8, 6)), ((3, 1), (3, 9))]
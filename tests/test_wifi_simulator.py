@@ -0,0 +1,78 @@
+import random
+import numpy as np
+import pytest
+from playground.wifi_simulator import WiFiSimulator
+
+def random_simulator(seed, num_of_walls=25):
+    rng = random.Random(seed)
+    wifi = WiFiSimulator(source_position=(rng.uniform(2, 8), rng.uniform(2, 8)))
+    for _ in range(num_of_walls):
+        wifi.add_wall((rng.uniform(0, 10), rng.uniform(0, 10)), (rng.uniform(0, 10), rng.uniform(0, 10)),
+                      attenuation_db=rng.choice([3.0, 8.0, 12.0]))
+    return wifi
+
+@pytest.mark.parametrize('seed', range(3))
+def test_heatmap_matches_point_by_point(seed):
+    wifi = random_simulator(seed)
+    X, Y, signal_strength = wifi.generate_heatmap((0, 10), (0, 10), resolution=23, method='direct')
+    expected = [[wifi.calculate_signal_strength((x, y)) for x, y in zip(row_x, row_y)] for row_x, row_y in zip(X, Y)]
+    assert signal_strength.shape == (23, 23)
+    assert np.allclose(signal_strength, expected)
+
+def test_chunks_do_not_change_attenuation():
+    wifi = random_simulator(7)
+    points = np.random.default_rng(7).uniform(0, 10, size=(500, 2))
+    whole = wifi.calculate_wall_attenuations(points, 'direct', chunk_size=len(points))
+    for chunk_size in (1, 7, 64):
+        assert np.array_equal(wifi.calculate_wall_attenuations(points, 'direct', chunk_size=chunk_size), whole)
+
+def test_wall_between_source_and_point_attenuates():
+    wifi = WiFiSimulator(source_position=(0.0, 0.0))
+    wifi.add_wall((1.0, -1.0), (1.0, 1.0), attenuation_db=12.0)
+    wifi.add_wall((-1.0, -1.0), (-1.0, 1.0), attenuation_db=5.0)
+    behind, beside, open_side = wifi.calculate_signal_strengths([(2.0, 0.0), (0.0, 2.0), (-2.0, 0.0)], 'direct')
+    assert behind == pytest.approx(open_side - 7.0)
+    assert beside == pytest.approx(wifi.calculate_signal_strength((0.0, 2.0)))
+    assert wifi.calculate_signal_strengths([wifi.source_position], 'direct')[0] == wifi.source_power_dbm
+
+@pytest.mark.parametrize('seed', range(3))
+def test_sectors_match_direct(seed):
+    wifi = random_simulator(seed, num_of_walls=60)
+    # a wall whose line passes through the source spans no sector
+    sx, sy = wifi.source_position
+    wifi.add_wall((sx + 1, sy + 1), (sx + 3, sy + 3), attenuation_db=4.0)
+    points = np.random.default_rng(seed).uniform(-2, 12, size=(2000, 2))
+    # paths through wall endpoints lie on sector bounds
+    endpoints = np.array([end for wall in wifi.walls for end in (wall.start, wall.end)])
+    through_endpoints = wifi.source_position + (endpoints - wifi.source_position) * np.array([[0.5], [1.0], [1.7]])[:, None]
+    points = np.vstack([points, through_endpoints.reshape(-1, 2)])
+    assert np.allclose(wifi.calculate_wall_attenuations(points, 'sectors'),
+                       wifi.calculate_wall_attenuations(points, 'direct'))
+
+def test_sector_holds_only_walls_spanning_it():
+    wifi = random_simulator(4, num_of_walls=40)
+    sx, sy = wifi.source_position
+    walls, bounds, sector_walls, degenerate = wifi._angular_partition()
+    assert len(sector_walls) == len(bounds)
+    for k, lower in enumerate(bounds):
+        upper = bounds[(k + 1) % len(bounds)] + (2 * np.pi if k + 1 == len(bounds) else 0)
+        middle = (lower + upper) / 2
+        # walls crossed by a long path through the middle of the sector
+        far = (sx + 100 * np.cos(middle), sy + 100 * np.sin(middle))
+        crossed = {i for i, wall in enumerate(wifi.walls) if wall.intersects_line(wifi.source_position, far)}
+        assert crossed <= set(sector_walls[k].tolist())
+        assert len(sector_walls[k]) < len(wifi.walls)
+
+def test_partition_follows_walls_and_source():
+    wifi = WiFiSimulator(source_position=(0.0, 0.0))
+    wifi.add_wall((1.0, -1.0), (1.0, 1.0), attenuation_db=12.0)
+    point = [(2.0, 0.0)]
+    assert wifi.calculate_wall_attenuations(point)[0] == 12.0
+    wifi.add_wall((1.5, -1.0), (1.5, 1.0), attenuation_db=5.0)
+    assert wifi.calculate_wall_attenuations(point)[0] == 17.0
+    wifi.source_position = (3.0, 0.0)
+    assert wifi.calculate_wall_attenuations(point)[0] == 0.0
+
+def test_unknown_attenuation_method():
+    with pytest.raises(ValueError):
+        WiFiSimulator(source_position=(0.0, 0.0)).calculate_wall_attenuations([(1.0, 1.0)], method='rays')
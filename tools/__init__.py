@@ -5,7 +5,14 @@ imported as `tools.*` when running scripts from the workspace root.
 """
 
 __all__ = [
+    "corpus",
     "geometric",
+    "instrumentation",
     "k_visibility",
+    "measurement_cache",
+    "measurement_executor",
+    "measurement_io",
+    "segment_array",
     "segment_presentation",
+    "streaming",
 ]
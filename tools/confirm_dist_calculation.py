@@ -1,37 +1,44 @@
-import random
+from functools import lru_cache
+import numpy as np
 
 def find_dist(width, height, num_of_values, min_prob):
     """ Given a width, height, number of points. 
     the function will find the distance needed between two rays so that there won't be two points
     at the same ray with a probability of at least min_prob.
+    Inverts exact_prob, so it returns the largest such distance.
     """
-    x_prev = 0
-    x_curr = 1
-    found = False
-    while (not found):
-        if find_prob(min(width, height), num_of_values, x_curr) > min_prob:
-            found = True
-        else:
-            tmp = x_prev
-            x_curr = (x_curr + x_prev)/2
-            x_prev = tmp
+    min_dimention = min(width, height)
+    if num_of_values < 2:
+        return min_dimention
+    return min_dimention * (1 - min_prob ** (1 / num_of_values)) / (num_of_values - 1)
 
-    return x_curr
+@lru_cache(maxsize=None)
+def exact_prob(min_dimention, num_of_values, max_length_between_vals):
+    """
+    Probability that num_of_values uniform values in [0, min_dimention] are
+    all at least max_length_between_vals apart: removing the (n-1) minimal
+    gaps leaves n uniform values in a segment shorter by (n-1)*length, so
+    the probability is (1 - (n-1)*length/min_dimention)**n.
+    """
+    if num_of_values < 2:
+        return 1.0
+    free_part = 1 - (num_of_values - 1) * max_length_between_vals / min_dimention
+    return max(free_part, 0.0) ** num_of_values
 
-def find_prob(min_dimention, num_of_values, max_length_between_vals):
-    results = []
-    for test in range(10000):
-        vals = []
-        for _ in range(num_of_values):
-            vals.append(random.uniform(0,min_dimention))
-        found_two_close_points = True
-        for i in range(len(vals)-1):
-            for j in range(i+1, len(vals)):
-                if abs(vals[i] - vals[j]) < max_length_between_vals:
-                    found_two_close_points = False
-        results.append(found_two_close_points)
-    print(f"Length: {max_length_between_vals}. Prob: {sum(results)/len(results)}")
-    return sum(results)/len(results)
+def find_prob(min_dimention, num_of_values, max_length_between_vals, trials=10000, rng=None):
+    """
+    Monte Carlo estimate of exact_prob: the fraction of trials whose sorted
+    values have no gap smaller than max_length_between_vals. All trials are
+    drawn and checked as one array (in chunks of a few million values).
+    rng: numpy Generator, defaults to a fresh np.random.default_rng()
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    chunk = max(1, 2**22 // max(num_of_values, 1))
+    successes = 0
+    for start in range(0, trials, chunk):
+        vals = np.sort(rng.uniform(0, min_dimention, (min(chunk, trials - start), num_of_values)), axis=1)
+        successes += np.count_nonzero(np.all(np.diff(vals, axis=1) >= max_length_between_vals, axis=1))
+    return successes / trials
 
 def calculate_dist(width, height, num_of_values, prob=0.9):
     # Area between two array is smaller than the area of the main diagonal.
@@ -52,6 +59,6 @@ def calculate_dist(width, height, num_of_values, prob=0.9):
 
 
 if __name__ == "__main__":
-    # print(find_prob(1,2,0.25))
+    # print(find_prob(1,2,0.25), exact_prob(1,2,0.25))
     # print(find_dist(10,8,10,0.99))
     print(calculate_dist(10,8,10,0.99))
@@ -0,0 +1,179 @@
+import sys, os
+workspace_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if workspace_root not in sys.path:
+    sys.path.insert(0, workspace_root)
+
+import json
+import random
+import numpy as np
+from any_building_reconstraction.any_building import AnyBuilding
+from grid_building_reconstraction.building import GridBuilding
+from strait_building_reconstraction.strait_building import StraitBuilding
+from tools.segment_array import SegmentArray
+
+FAMILIES = ('strait', 'any', 'grid')
+CORPUS_VERSION = 4
+# default restarts of the any generator before a spec is given up
+MAX_ANY_RESTARTS = 100
+
+def corpus_specs(family, num_of_buildings, first_seed=0, width=8, height=10, num_of_segments=14, prob=0.1):
+    """
+    Specs of num_of_buildings buildings of one family with the seeds
+    first_seed, first_seed+1, ...
+    num_of_segments is used by the strait and any families, prob (the fill
+    probability of fill_grid_randomly) by the grid family.
+    returns: list of dict, one per building
+    """
+    if family not in FAMILIES:
+        raise ValueError(f"Unknown building family: {family}")
+    specs = []
+    for seed in range(first_seed, first_seed + num_of_buildings):
+        spec = {'family': family, 'seed': seed, 'width': width, 'height': height}
+        if family == 'grid':
+            spec['prob'] = prob
+        else:
+            spec['num_of_segments'] = num_of_segments
+        specs.append(spec)
+    return specs
+
+def generate_building(spec, max_restarts=MAX_ANY_RESTARTS):
+    """
+    Generates the building of a spec. The strait and any generators draw
+    from the global random module, which is seeded with the spec's seed and
+    restored afterwards, the grid generator gets its own generator.
+    max_restarts: times the any generator starts the wall placement over
+        before giving up
+    raises ValueError if the points or walls of an any spec can not be placed
+    """
+    family = spec['family']
+    if family == 'grid':
+        return GridBuilding(spec['width'], spec['height'], frame=True,
+                            rng=np.random.default_rng(spec['seed']), prob=spec['prob'])
+    if family not in ('strait', 'any'):
+        raise ValueError(f"Unknown building family: {family}")
+
+    state = random.getstate()
+    random.seed(spec['seed'])
+    try:
+        if family == 'strait':
+            building = StraitBuilding(spec['width'], spec['height'])
+            building.create_random_building(spec['num_of_segments'])
+            return building
+        # the any generator can run out of legal walls, start over from the
+        # current random state, which keeps the result a function of the seed.
+        # Points that do not fit fail the same way every time, so only the
+        # wall placement is retried.
+        for _ in range(max_restarts):
+            building = AnyBuilding(spec['width'], spec['height'])
+            building.add_frame()
+            try:
+                points = building.add_random_points(spec['num_of_segments'])
+            except ValueError as e:
+                raise ValueError(f"Could not place the points of {spec}: {e}") from e
+            try:
+                building.add_random_segments(spec['num_of_segments'], points, max_attempts=100 * spec['num_of_segments'])
+                return building
+            except ValueError:
+                continue
+        raise ValueError(f"Could not place the walls of {spec} in {max_restarts} restarts")
+    finally:
+        random.setstate(state)
+
+class BuildingCorpus():
+    """
+    Buildings of one family stored as a directory with
+        coords.npy: (S,2,2) float64, the walls of all buildings back to back
+        offsets.npy: (N+1,) int64, the walls of building i are
+            coords[offsets[i]:offsets[i+1]]
+        flags.npy: (S,) uint8, the SegmentArray flags of the walls
+        meta.json: the specs of the buildings
+    The arrays are memory-mapped, a building is only materialized when it is
+    indexed.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('version') != CORPUS_VERSION:
+            raise ValueError(f"Unsupported corpus version in {path}: {meta.get('version')}")
+        self.specs = meta['specs']
+        self.coords = np.load(os.path.join(path, 'coords.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'), mmap_mode='r')
+        self.flags = np.load(os.path.join(path, 'flags.npy'), mmap_mode='r')
+
+    def __len__(self):
+        return len(self.specs)
+
+    def segments(self, idx):
+        """Walls of building idx as a read-only (n,2,2) array view."""
+        return self.coords[self.offsets[idx]:self.offsets[idx + 1]]
+
+    def __getitem__(self, idx):
+        spec = self.specs[idx]
+        if spec['family'] in ('strait', 'any'):
+            building_class = StraitBuilding if spec['family'] == 'strait' else AnyBuilding
+            building = building_class(spec['width'], spec['height'], segments=self.segments(idx))
+            building.segments.flags[:] = self.flags[self.offsets[idx]:self.offsets[idx + 1]]
+            return building
+        segments = [[tuple(p) for p in seg] for seg in self.segments(idx).tolist()]
+        building = GridBuilding(spec['width'], spec['height'], segments=segments)
+        # grid walls are restored as line arrays, with int coordinates
+        building.update_lines()
+        building.update_segments()
+        return building
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+def save_corpus(path, specs, buildings):
+    """Writes the buildings of one family to path, see BuildingCorpus."""
+    os.makedirs(path, exist_ok=True)
+    # meta.json is removed first and written last, a corpus without it is incomplete
+    if os.path.exists(os.path.join(path, 'meta.json')):
+        os.remove(os.path.join(path, 'meta.json'))
+    counts = [len(building.segments) for building in buildings]
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    coords = np.zeros((offsets[-1], 2, 2), dtype=np.float64)
+    flags = np.zeros(offsets[-1], dtype=np.uint8)
+    for idx, building in enumerate(buildings):
+        coords[offsets[idx]:offsets[idx + 1]] = np.asarray(building.segments, dtype=np.float64).reshape(-1, 2, 2)
+        # grid buildings keep plain lists without flags
+        if isinstance(building.segments, SegmentArray):
+            flags[offsets[idx]:offsets[idx + 1]] = building.segments.flags
+    np.save(os.path.join(path, 'coords.npy'), coords)
+    np.save(os.path.join(path, 'offsets.npy'), offsets)
+    np.save(os.path.join(path, 'flags.npy'), flags)
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump({'version': CORPUS_VERSION, 'specs': specs}, f, indent=4)
+
+def build_corpus(path, specs):
+    """Generates the buildings of specs, saves them to path and loads them back."""
+    families = {spec['family'] for spec in specs}
+    if len(families) > 1:
+        raise ValueError(f"A corpus holds one building family, got {sorted(families)}")
+    save_corpus(path, specs, [generate_building(spec) for spec in specs])
+    return BuildingCorpus(path)
+
+def load_or_build_corpus(path, specs):
+    """
+    The corpus at path if it was built from the same specs, otherwise builds
+    it, so repeated runs skip the generation.
+    """
+    try:
+        corpus = BuildingCorpus(path)
+    except (OSError, ValueError, KeyError):
+        return build_corpus(path, specs)
+    # compare through json, like the stored specs
+    if corpus.specs != json.loads(json.dumps(specs)):
+        return build_corpus(path, specs)
+    return corpus
+
+if __name__ == '__main__':
+    import tempfile
+    with tempfile.TemporaryDirectory() as root:
+        for family in FAMILIES:
+            path = os.path.join(root, family)
+            corpus = load_or_build_corpus(path, corpus_specs(family, 3))
+            print(family, len(corpus), [len(building.segments) for building in corpus])
@@ -1,4 +1,8 @@
+import math
+import random
 from shapely.geometry import Point, LineString
+from tools import instrumentation
+from tools.k_visibility import orientation_sign
 # import shapely
 
 def point_to_line_dist(p, line):
@@ -16,6 +20,39 @@ def lines_are_overlap(line1, line2):
     intersection = LineString(line1).intersection(LineString(line2))
     return intersection.length > 0
 
+def segment_point_dist(p, line):
+    """
+    Same as point_to_line_dist, computed with plain arithmetic (the formula
+    GEOS uses) instead of building Shapely geometries.
+    """
+    (ax, ay), (bx, by) = line
+    px, py = p
+    dx, dy = bx - ax, by - ay
+    len2 = dx*dx + dy*dy
+    if len2 == 0:
+        return _dist(p, line[0])
+    r = ((px - ax)*dx + (py - ay)*dy) / len2
+    if r <= 0:
+        return _dist(p, line[0])
+    if r >= 1:
+        return _dist(p, line[1])
+    s = ((ay - py)*dx - (ax - px)*dy) / len2
+    return abs(s) * math.sqrt(len2)
+
+def segments_overlap(line1, line2):
+    """
+    Same as lines_are_overlap without Shapely: the segments overlap when they
+    are colinear and share more than a point.
+    """
+    (x1, y1), (x2, y2) = line1
+    if orientation_sign(line1[0], line1[1], line2[0]) != 0 or orientation_sign(line1[0], line1[1], line2[1]) != 0:
+        return False
+    # colinear, compare the projections on the axis the first line spans
+    axis = 0 if x1 != x2 else 1
+    lo = max(min(line1[0][axis], line1[1][axis]), min(line2[0][axis], line2[1][axis]))
+    hi = min(max(line1[0][axis], line1[1][axis]), max(line2[0][axis], line2[1][axis]))
+    return lo < hi
+
 from typing import Tuple
 from shapely.geometry import LineString, Point
 import math
@@ -94,47 +131,139 @@ def parallelogram_center_from_parallel_lines(lines1, lines2, *, tol: float = 1e-
     cy = (p11[1] + p12[1] + p21[1] + p22[1]) / 4.0
     return (cx, cy)
 
+def _point_grid(points, cell):
+    """Bucket point indices by the square grid cell of side `cell` they fall in."""
+    grid = {}
+    for idx, p in enumerate(points):
+        grid.setdefault((math.floor(p[0] / cell), math.floor(p[1] / cell)), []).append(idx)
+    return grid
+
+def _grid_neighbours(grid, p, cell):
+    """Indices of the points in the 3x3 cells around p, in increasing order."""
+    cx, cy = math.floor(p[0] / cell), math.floor(p[1] / cell)
+    found = []
+    for gx in (cx - 1, cx, cx + 1):
+        for gy in (cy - 1, cy, cy + 1):
+            found.extend(grid.get((gx, gy), ()))
+    found.sort()
+    return found
+
+def _dist(p1, p2):
+    dx = p1[0] - p2[0]
+    dy = p1[1] - p2[1]
+    return math.sqrt(dx*dx + dy*dy)
+
+class SegmentGrid():
+    """
+    Incremental bucket index of segments: every segment is stored in the
+    square cells of side `cell_size` its bounding box covers, so segments
+    near a query are found without scanning all of them.
+    """
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.segments = []
+        self._cells = {}
+        self._source = None
+
+    def __len__(self):
+        return len(self.segments)
+
+    def sync(self, segments):
+        """
+        Bring the grid up to date with `segments`, e.g. the walls of a
+        building that are only ever appended to: the segments past the ones
+        already in the grid are added. The grid is rebuilt if `segments` is
+        not the sequence of the last sync or got shorter. Edits that keep the
+        length, such as writing through SegmentArray.coords, are not noticed;
+        sync a new grid after them.
+        returns: the grid
+        """
+        if segments is not self._source or len(self.segments) > len(segments):
+            self.segments = []
+            self._cells = {}
+            self._source = segments
+        for seg in segments[len(self.segments):]:
+            self.add(seg)
+        return self
+
+    def _cell_range(self, seg, margin=0):
+        xs = (seg[0][0], seg[1][0])
+        ys = (seg[0][1], seg[1][1])
+        return (range(math.floor((min(xs) - margin) / self.cell_size), math.floor((max(xs) + margin) / self.cell_size) + 1),
+                range(math.floor((min(ys) - margin) / self.cell_size), math.floor((max(ys) + margin) / self.cell_size) + 1))
+
+    def add(self, seg):
+        idx = len(self.segments)
+        self.segments.append(seg)
+        gxs, gys = self._cell_range(seg)
+        for gx in gxs:
+            for gy in gys:
+                self._cells.setdefault((gx, gy), []).append(idx)
+
+    def query(self, seg, margin=0):
+        """
+        Segments whose bounding box may be within `margin` of the bounding
+        box of seg, in the order they were added.
+        """
+        found = set()
+        gxs, gys = self._cell_range(seg, margin)
+        for gx in gxs:
+            for gy in gys:
+                found.update(self._cells.get((gx, gy), ()))
+        return [self.segments[idx] for idx in sorted(found)]
+
 def find_close_points(set1: list, set2: list, dist, remove_doubles=False):
+    """
+    Midpoints of every pair (p1 from set1, p2 from set2) closer than `dist`,
+    in the order of a nested loop over set1 then set2. set2 is bucketed in a
+    grid of cell size `dist`, so only neighbouring cells are compared.
+
+    With remove_doubles every point is used in one pair at most, and the
+    matched points are removed from set1 and set2.
+    """
     close_points = []
-    for p1 in set1:
-        for p2 in set2:
-            p1 = Point(p1)
-            p2 = Point(p2)
-            if p1.distance(p2) < dist:
-                close_points.append(((p1.x+p2.x)/2, (p1.y+p2.y)/2))
+    if dist <= 0 or not set1 or not set2:
+        return close_points
+    grid = _point_grid(set2, dist)
+    used1 = set()
+    used2 = set()
+    for i, p1 in enumerate(set1):
+        for j in _grid_neighbours(grid, p1, dist):
+            if remove_doubles and j in used2:
+                continue
+            p2 = set2[j]
+            if _dist(p1, p2) < dist:
+                close_points.append(((p1[0]+p2[0])/2, (p1[1]+p2[1])/2))
                 if remove_doubles:
-                    set1.remove(p1)
-                    set2.remove(p2)
-    
-    return close_points
+                    used1.add(i)
+                    used2.add(j)
+                    break
+    if remove_doubles:
+        set1[:] = [p for i, p in enumerate(set1) if i not in used1]
+        set2[:] = [p for j, p in enumerate(set2) if j not in used2]
 
-def combine_close_points(set1, set2, dist):
-    close_points = []
-    to_remove = []
-    for p1 in set1:
-        for p2 in set2:
-            p1 = Point(p1)
-            p2 = Point(p2)
-            if p1.distance(p2) < dist:
-                close_points.append(((p1.x+p2.x)/2, (p1.y+p2.y)/2))
-                to_remove.append(p1.x,p1.y)
-                to_remove.append(p2.x,p2.y)
-    
-    return close_points - to_remove
+    return close_points
 
 def combine_close_points(point_list, dist):
-    to_add = []
-    to_remove = []
-    for i in range(len(point_list)-1):
-        for j in range(i+1, len(point_list)):
-            p1 = Point(point_list[i])
-            p2 = Point(point_list[j])
-            if p1.distance(p2) < dist:
-                # to_add.append(((p1.x+p2.x)/2, (p1.y+p2.y)/2))
-                # to_remove.append((p1.x,p1.y))
-                to_remove.append((p2.x,p2.y))
-    point_list = point_list
-    point_list = [p for p in point_list if p not in to_remove]
+    """
+    Drop every point that has an earlier point of the list closer than
+    `dist`, keeping the order of the rest, so the first point of each
+    cluster (and of each group of exact copies) is kept.
+    Points are bucketed in a grid of cell size `dist`, so each point is only
+    compared with the points of its neighbouring cells.
+    """
+    if dist <= 0:
+        return list(point_list)
+    grid = _point_grid(point_list, dist)
+    to_remove = set()
+    for j, p in enumerate(point_list):
+        for i in _grid_neighbours(grid, p, dist):
+            if i >= j:
+                break
+            if _dist(point_list[i], p) < dist:
+                to_remove.add(j)
+                break
+    point_list = [p for j, p in enumerate(point_list) if j not in to_remove]
     return point_list
 
 def find_close_points_by_axis(point_list, dist):
@@ -151,16 +280,95 @@ def find_close_points_by_axis(point_list, dist):
     
     return segments, same_axis_points
 
+def poisson_disk_sample(width, height, min_dist, num_of_points, rng=None, k=30):
+    """
+    num_of_points random points of the rectangle [0,width]x[0,height], no two
+    of them closer than min_dist, as a list of (x,y).
+
+    Points are first thrown uniformly at random, k throws per requested
+    point; if the area is too crowded for that, the gaps are filled with
+    Bridson's algorithm, which samples k candidates around every placed
+    point until none fits. Both use a background grid of cell size
+    min_dist/sqrt(2), which holds at most one point per cell, so every
+    candidate is checked against a constant number of cells.
+
+    Bridson's algorithm alone grows outwards from its first point, so when
+    fewer points are requested than fit, they end up packed around it
+    instead of spread over the rectangle like the rejection sampling this
+    replaces; the uniform throws keep that distribution for the usual,
+    sparse requests and leave Bridson the crowded ones.
+
+    rng: object with random() and uniform(), defaults to the random module
+    raises ValueError if num_of_points points do not fit
+    """
+    rng = rng if rng is not None else random
+    if min_dist <= 0:
+        return [(rng.uniform(0, width), rng.uniform(0, height)) for _ in range(num_of_points)]
+    cell = min_dist / math.sqrt(2)
+    cols = int(width / cell) + 1
+    rows = int(height / cell) + 1
+    grid = [[None] * rows for _ in range(cols)]
+    points = []
+
+    def fits(x, y):
+        if not (0 <= x <= width and 0 <= y <= height):
+            return False
+        gx, gy = int(x / cell), int(y / cell)
+        for i in range(max(gx - 2, 0), min(gx + 3, cols)):
+            for j in range(max(gy - 2, 0), min(gy + 3, rows)):
+                p = grid[i][j]
+                if p is not None and _dist(p, (x, y)) < min_dist:
+                    return False
+        return True
+
+    def place(x, y):
+        grid[int(x / cell)][int(y / cell)] = (x, y)
+        points.append((x, y))
+
+    for _ in range(k * num_of_points):
+        if len(points) >= num_of_points:
+            return points
+        x, y = rng.uniform(0, width), rng.uniform(0, height)
+        if fits(x, y):
+            place(x, y)
+
+    # too crowded for random throws, fill the gaps around the placed points
+    if not points:
+        place(rng.uniform(0, width), rng.uniform(0, height))
+    active = list(points)
+    while active and len(points) < num_of_points:
+        idx = int(rng.random() * len(active))
+        cx, cy = active[idx]
+        for _ in range(k):
+            # uniform in the annulus between min_dist and 2*min_dist
+            r = min_dist * math.sqrt(1 + 3 * rng.random())
+            theta = 2 * math.pi * rng.random()
+            x, y = cx + r * math.cos(theta), cy + r * math.sin(theta)
+            if fits(x, y):
+                place(x, y)
+                active.append((x, y))
+                break
+        else:
+            active[idx] = active[-1]
+            active.pop()
+    if len(points) < num_of_points:
+        raise ValueError(f"Only {len(points)} of {num_of_points} points fit in a {width}x{height} "
+                         f"area with min_dist {min_dist}")
+    return points[:num_of_points]
+
 from typing import Tuple
-from shapely.geometry import LineString, Point, Polygon, box
+from shapely.geometry import LineString, Point
+import numpy as np
 import math
 
-def _line_normal_and_offset(ls: LineString, *, tol=1e-12) -> Tuple[Tuple[float,float], float]:
+def _line_normal_and_offset(line, *, tol=1e-12) -> Tuple[Tuple[float,float], float]:
     """
-    Return a unit normal vector n and offset c for the infinite line of `ls`,
-    such that the line is { x | n·x = c } with n unit length.
+    Return a unit normal vector n and offset c for the infinite line through
+    `line` (a LineString or ((x1,y1),(x2,y2))), such that the line is
+    { x | n·x = c } with n unit length.
     """
-    (x1, y1), (x2, y2) = ls.coords[0], ls.coords[-1]
+    coords = line.coords if isinstance(line, LineString) else line
+    (x1, y1), (x2, y2) = coords[0], coords[-1]
     vx, vy = x2 - x1, y2 - y1
     L = math.hypot(vx, vy)
     if L <= tol:
@@ -173,10 +381,11 @@ def _line_normal_and_offset(ls: LineString, *, tol=1e-12) -> Tuple[Tuple[float,f
     c = nx * x1 + ny * y1
     return (nx, ny), c
 
-def _pair_to_strip(a: LineString, b: LineString, *, M=1e6, tol=1e-12) -> Polygon:
+def _pair_to_strip(a, b, *, tol=1e-12) -> Tuple[Tuple[float,float], float, float]:
     """
-    Convert two parallel lines into a (very long) rectangular strip Polygon bounded by them.
-    Uses a long midline segment buffered with square caps to emulate an infinite strip.
+    Convert two parallel lines into the strip { x | lo <= n·x <= hi } bounded by them,
+    with n a unit normal. The strip is widened by 1e-9 on both sides so that
+    strips sharing a boundary line still intersect.
     """
     (na, ca) = _line_normal_and_offset(a, tol=tol)
     (nb, cb) = _line_normal_and_offset(b, tol=tol)
@@ -191,8 +400,6 @@ def _pair_to_strip(a: LineString, b: LineString, *, M=1e6, tol=1e-12) -> Polygon
     if abs(na[0]*nb[1] - na[1]*nb[0]) > 1e-10:
         raise ValueError("Lines in a pair are not parallel.")
 
-    # Midline normal & offset
-    n = na  # unit
     cmin, cmax = sorted((ca, cb))
     c_mid = 0.5 * (cmin + cmax)
     half_width = 0.5 * (cmax - cmin)
@@ -201,20 +408,41 @@ def _pair_to_strip(a: LineString, b: LineString, *, M=1e6, tol=1e-12) -> Polygon
         # Practically the same line; use a very thin strip
         half_width = tol
 
-    # A point on the midline: x0 = c_mid * n (since ||n||=1 ⇒ n·x0 = c_mid)
-    x0 = (c_mid * n[0], c_mid * n[1])
-
-    # Direction along the strip (parallel to the original lines) is d = rotate -90° of n
-    d = (n[1], -n[0])  # unit as well
-
-    # Build a very long segment along the midline and buffer it to make the strip
-    L = M  # long enough to cover our big bbox
-    p1 = (x0[0] - L * d[0], x0[1] - L * d[1])
-    p2 = (x0[0] + L * d[0], x0[1] + L * d[1])
-    mid_seg = LineString([p1, p2])
-    # Square caps avoid rounded ends interacting oddly with other strips
-    strip = mid_seg.buffer(half_width + 1e-9, cap_style=2)
-    return strip
+    half_width += 1e-9
+    return na, c_mid - half_width, c_mid + half_width
+
+def _clip_polygon(vertices, n, c):
+    """Sutherland–Hodgman step: keep the part of a convex polygon where n·x <= c."""
+    clipped = []
+    for k in range(len(vertices)):
+        p = vertices[k - 1]
+        q = vertices[k]
+        dp = n[0]*p[0] + n[1]*p[1] - c
+        dq = n[0]*q[0] + n[1]*q[1] - c
+        if dp <= 0:
+            clipped.append(p)
+        if (dp < 0 < dq) or (dq < 0 < dp):
+            t = dp / (dp - dq)
+            clipped.append((p[0] + t*(q[0] - p[0]), p[1] + t*(q[1] - p[1])))
+    return clipped
+
+def _polygon_center(vertices):
+    """Centroid of a polygon given by its ordered vertices, or the mean vertex if it has no area."""
+    # Work relative to the first vertex to avoid cancellation on thin polygons
+    bx, by = vertices[0]
+    area2 = cx = cy = 0.0
+    for k in range(len(vertices)):
+        x1, y1 = vertices[k - 1][0] - bx, vertices[k - 1][1] - by
+        x2, y2 = vertices[k][0] - bx, vertices[k][1] - by
+        cross = x1*y2 - x2*y1
+        area2 += cross
+        cx += (x1 + x2) * cross
+        cy += (y1 + y2) * cross
+    if area2 == 0:
+        # Degenerate cases: intersection is a segment or a point
+        n = len(vertices)
+        return (sum(v[0] for v in vertices) / n, sum(v[1] for v in vertices) / n)
+    return (bx + cx / (3*area2), by + cy / (3*area2))
 
 def center_of_three_parallel_pairs(
     a1: list, a2: list,
@@ -225,47 +453,250 @@ def center_of_three_parallel_pairs(
     tol: float = 1e-9
 ) -> Tuple:
     """
-    Given three pairs of parallel Shapely LineStrings, compute the (x, y) point
+    Given three pairs of parallel lines, compute the (x, y) point
     at the 'middle' of the polygon formed by the intersection of the three strips
-    (the regions between each pair). Returns centroid of the intersection polygon.
-
-    Raises:
-        ValueError if the intersection is empty or numerically ill-conditioned.
-    """
-    a1 = LineString(a1)
-    a2 = LineString(a2)
-    b1 = LineString(b1)
-    b2 = LineString(b2)
-    c1 = LineString(c1)
-    c2 = LineString(c2)
-    # Start with a huge bounding box, then clip by each strip
-    poly = box(-bbox_extent, -bbox_extent, bbox_extent, bbox_extent)
-
-    for (p, q) in ((a1, a2), (b1, b2), (c1, c2)):
-        strip = _pair_to_strip(p, q, M=bbox_extent, tol=tol)
-        poly = poly.intersection(strip)
-        if poly.is_empty:
-            return None
-            # raise ValueError("No common intersection region for the three strips.")
-        # If intersection returns a MultiPolygon, take its union to keep things clean
-        if poly.geom_type == "MultiPolygon":
-            poly = poly.buffer(0)
-
-    # If result is Polygon (usual), take centroid; if LineString/Point (degenerate), return that
-    if poly.is_empty:
-        return None
-        # raise ValueError("No common intersection region for the three strips.")
-    if poly.geom_type == "Polygon":
-        ctr = poly.centroid
-    elif poly.geom_type == "MultiPolygon":
-        # Choose the largest component’s centroid
-        largest = max(poly.geoms, key=lambda g: g.area)
-        ctr = largest.centroid
+    (the regions between each pair). Returns centroid of the intersection polygon,
+    or None if the strips do not intersect.
+
+    The strips are six half-planes: the parallelogram of the first two strips
+    (or a square of half size `bbox_extent` when they are parallel) is clipped
+    by the remaining ones, so only a handful of floats are touched per call.
+    """
+    instrumentation.count('strip_clip_calls')
+    instrumentation.count('strip_clip_triples')
+    strips = [_pair_to_strip(p, q, tol=tol) for (p, q) in ((a1, a2), (b1, b2), (c1, c2))]
+    (na, lo_a, hi_a), (nb, lo_b, hi_b) = strips[0], strips[1]
+    det = na[0]*nb[1] - na[1]*nb[0]
+    if abs(det) > 1e-12:
+        def corner(ca, cb):
+            # solve na·x = ca, nb·x = cb
+            return ((ca*nb[1] - cb*na[1]) / det, (na[0]*cb - nb[0]*ca) / det)
+        poly = [corner(lo_a, lo_b), corner(hi_a, lo_b), corner(hi_a, hi_b), corner(lo_a, hi_b)]
+        strips = strips[2:]
     else:
-        # Degenerate cases: intersection is a segment or a point
-        ctr = poly.representative_point()
+        poly = [(-bbox_extent, -bbox_extent), (bbox_extent, -bbox_extent),
+                (bbox_extent, bbox_extent), (-bbox_extent, bbox_extent)]
+
+    for n, lo, hi in strips:
+        poly = _clip_polygon(poly, n, hi)
+        poly = _clip_polygon(poly, (-n[0], -n[1]), -lo)
+        if not poly:
+            return None
+
+    return _polygon_center(poly)
+
+def _strips(pairs, tol):
+    """Vectorized _pair_to_strip for an (N, 2, 2, 2) array of line pairs."""
+    direction = pairs[:, :, 1] - pairs[:, :, 0]
+    length = np.hypot(direction[..., 0], direction[..., 1])
+    if (length <= tol).any():
+        raise ValueError("Degenerate LineString (zero length).")
+    normal = np.stack([-direction[..., 1], direction[..., 0]], axis=-1) / length[..., None]
+    offset = (normal * pairs[:, :, 0]).sum(-1)
+    # make the normal of the second line agree with the first one
+    flip = (normal[:, 0] * normal[:, 1]).sum(-1) < 0
+    offset[flip, 1] *= -1
+    if (np.abs(normal[:, 0, 0]*normal[:, 1, 1] - normal[:, 0, 1]*normal[:, 1, 0]) > 1e-10).any():
+        raise ValueError("Lines in a pair are not parallel.")
+    n = normal[:, 0]
+    cmin = offset.min(axis=1)
+    cmax = offset.max(axis=1)
+    c_mid = 0.5 * (cmin + cmax)
+    half_width = np.maximum(0.5 * (cmax - cmin), tol) + 1e-9
+    return n, c_mid - half_width, c_mid + half_width
+
+def centers_of_three_parallel_pairs(pairs_a, pairs_b, pairs_c, *, tol: float = 1e-9) -> np.ndarray:
+    """
+    Vectorized center_of_three_parallel_pairs.
+
+    pairs_a, pairs_b, pairs_c: array-like of shape (N, 2, 2, 2), row i holding
+        the two parallel lines ((x1,y1),(x2,y2)) of the i-th strip of each family
+    returns: (N, 2) array of centers, NaN where the three strips do not intersect
 
-    return (ctr.x, ctr.y)
+    The three strip directions of a row must not be parallel to each other,
+    then the intersection is bounded and its vertices are among the 12
+    crossings of boundary lines from different strips. The crossings that
+    lie inside all six half-planes are ordered by angle around their mean
+    and the polygon centroid is computed with the shoelace formula.
+    """
+    strips = [_strips(np.asarray(pairs, dtype=float).reshape(-1, 2, 2, 2), tol) for pairs in (pairs_a, pairs_b, pairs_c)]
+    normals = np.stack([s[0] for s in strips], axis=1)             # (N, 3, 2)
+    bounds = np.stack([np.stack(s[1:], axis=-1) for s in strips], axis=1)  # (N, 3, 2)
+    n_rows = normals.shape[0]
+    instrumentation.count('strip_clip_calls')
+    instrumentation.count('strip_clip_triples', n_rows)
+
+    candidates = []
+    for f, g in ((0, 1), (0, 2), (1, 2)):
+        nf, ng = normals[:, f], normals[:, g]
+        det = nf[:, 0]*ng[:, 1] - nf[:, 1]*ng[:, 0]
+        det = np.where(np.abs(det) <= 1e-12, np.nan, det)
+        for cf in (bounds[:, f, 0], bounds[:, f, 1]):
+            for cg in (bounds[:, g, 0], bounds[:, g, 1]):
+                # solve nf·x = cf, ng·x = cg
+                candidates.append(np.stack([(cf*ng[:, 1] - cg*nf[:, 1]) / det,
+                                            (nf[:, 0]*cg - ng[:, 0]*cf) / det], axis=-1))
+    points = np.stack(candidates, axis=1)                          # (N, 12, 2)
+
+    proj = np.einsum('nfk,npk->npf', normals, points)              # (N, 12, 3)
+    slack = 1e-12 * np.maximum(1, np.abs(bounds).max(axis=-1))[:, None, :]
+    feasible = ((proj >= bounds[:, None, :, 0] - slack) & (proj <= bounds[:, None, :, 1] + slack)).all(-1)
+    n_feasible = feasible.sum(axis=1)
+
+    centers = np.full((n_rows, 2), np.nan)
+    rows = n_feasible > 0
+    if not rows.any():
+        return centers
+    points, feasible, n_feasible = points[rows], feasible[rows], n_feasible[rows]
+
+    mean = np.where(feasible[..., None], points, 0).sum(axis=1) / n_feasible[:, None]
+    angle = np.arctan2(points[..., 1] - mean[:, 1, None], points[..., 0] - mean[:, 0, None])
+    order = np.argsort(np.where(feasible, angle, np.inf), axis=1)
+    ordered = np.take_along_axis(points, order[..., None], axis=1)
+    # pad the tail with the first vertex so the polygon closes on itself
+    first = ordered[:, :1]
+    tail = np.arange(points.shape[1])[None, :] >= n_feasible[:, None]
+    ordered = np.where(tail[..., None], first, ordered)
+
+    # shoelace relative to the mean vertex to avoid cancellation on thin polygons
+    ordered = ordered - mean[:, None, :]
+    nxt = np.roll(ordered, -1, axis=1)
+    cross = ordered[..., 0]*nxt[..., 1] - nxt[..., 0]*ordered[..., 1]
+    area2 = cross.sum(axis=1)
+    cx = ((ordered[..., 0] + nxt[..., 0]) * cross).sum(axis=1)
+    cy = ((ordered[..., 1] + nxt[..., 1]) * cross).sum(axis=1)
+    degenerate = area2 == 0
+    safe = np.where(degenerate, 1, 3*area2)
+    centers[rows] = mean + np.where(degenerate[:, None], 0, np.stack([cx / safe, cy / safe], axis=-1))
+    return centers
+
+def _family_intervals(pairs, tol):
+    """
+    A family of parallel strips as intervals on its common unit normal.
+    returns: normal, lo, hi, the indices sorting the strips by lo and the
+        widest interval
+    """
+    n = _strips(pairs, tol)[0][0]
+    proj = pairs @ n
+    lo = proj.min(axis=(1, 2)) - 1e-9
+    hi = proj.max(axis=(1, 2)) + 1e-9
+    order = np.argsort(lo, kind="stable")
+    return n, lo, hi, order, (hi - lo).max()
+
+def _overlapping(lo_sorted, order, max_width, lo, hi, slack):
+    """
+    Pairs (query, strip) of the query intervals [lo, hi] and the strips of a
+    family, sorted by their start lo_sorted, that may overlap, found with two
+    binary searches per query.
+    """
+    first = np.searchsorted(lo_sorted, lo - max_width - slack, side="left")
+    last = np.searchsorted(lo_sorted, hi + slack, side="right")
+    counts = np.maximum(last - first, 0)
+    query = np.repeat(np.arange(len(lo)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return query, order[np.repeat(first, counts) + offsets]
+
+def _strip_range_in_box(n, lo, hi, n_other, bounds, slack):
+    """
+    The range of n_other·x over the part of every strip lo <= n·x <= hi that
+    lies inside bounds, as (min, max) arrays; min > max where the strip
+    misses the box. The extremes are at box corners inside the strip or at
+    crossings of the strip lines with the box edges.
+    """
+    xmin, ymin, xmax, ymax = bounds[0] - slack, bounds[1] - slack, bounds[2] + slack, bounds[3] + slack
+    candidates = [np.broadcast_to(np.array(corner, dtype=float), (len(lo), 2))
+                  for corner in ((xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax))]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for c in (lo, hi):
+            for x in (xmin, xmax):
+                candidates.append(np.stack([np.full(len(c), x), (c - n[0]*x) / n[1]], axis=-1))
+            for y in (ymin, ymax):
+                candidates.append(np.stack([(c - n[1]*y) / n[0], np.full(len(c), y)], axis=-1))
+    points = np.stack(candidates, axis=1)                          # (N, 12, 2)
+    # crossings with edges parallel to the strip are not finite, drop them
+    finite = np.isfinite(points).all(-1)
+    points = np.where(finite[..., None], points, 0)
+    along = points @ n
+    inside = (finite
+              & (points[..., 0] >= xmin) & (points[..., 0] <= xmax)
+              & (points[..., 1] >= ymin) & (points[..., 1] <= ymax)
+              & (along >= lo[:, None] - slack) & (along <= hi[:, None] + slack))
+    proj = points @ n_other
+    range_lo = np.where(inside, proj, np.inf).min(axis=1)
+    range_hi = np.where(inside, proj, -np.inf).max(axis=1)
+    return range_lo, range_hi
+
+def find_strip_triples(pairs1, pairs2, pairs3, bounds=None, *, tol: float = 1e-9, chunk_size: int = 256):
+    """
+    All (i, j, k) such that strip i of the first family, strip j of the second
+    and strip k of the third intersect, with the center of the intersection.
+
+    pairs1, pairs2, pairs3: array-like of shape (R, 2, 2, 2); each is a family
+        of parallel strips, given as pairs of parallel lines
+    bounds: optional (xmin, ymin, xmax, ymax); only centers strictly inside are kept
+    returns: ((M, 3) int array of indices, (M, 2) array of centers), ordered
+        by (i, j, k) like a triple nested loop over the three families
+
+    Every family is an index of intervals on its normal, sorted by start.
+    For each strip i of the first family the strips k of the third family
+    crossing it inside `bounds` are found by binary search, and for each
+    such parallelogram (i, k) the strips j of the second family crossing it,
+    so only candidate triples are formed and the R1 x R2 cells are never
+    enumerated. The candidates are clipped with
+    centers_of_three_parallel_pairs. Two parallel families bound no
+    parallelogram, so they have no triples.
+    """
+    pairs = [np.asarray(p, dtype=float).reshape(-1, 2, 2, 2) for p in (pairs1, pairs2, pairs3)]
+    no_triples = (np.zeros((0, 3), dtype=int), np.zeros((0, 2)))
+    if any(len(p) == 0 for p in pairs):
+        return no_triples
+    (n1, lo1, hi1, _, _), (n2, lo2, hi2, order2, max_width2), (n3, lo3, hi3, order3, max_width3) = \
+        [_family_intervals(p, tol) for p in pairs]
+    for na, nb in ((n1, n2), (n1, n3), (n2, n3)):
+        if abs(na[0]*nb[1] - na[1]*nb[0]) <= 1e-12:
+            return no_triples
+    lo2_sorted, lo3_sorted = lo2[order2], lo3[order3]
+    slack = 1e-9
+
+    found = []
+    for start in range(0, len(lo1), chunk_size):
+        a = np.arange(start, min(start + chunk_size, len(lo1)))
+        # strips of the third family crossing strip i (inside the bounds)
+        if bounds is not None:
+            range_lo, range_hi = _strip_range_in_box(n1, lo1[a], hi1[a], n3, bounds, slack)
+        else:
+            range_lo, range_hi = np.full(len(a), -np.inf), np.full(len(a), np.inf)
+        query, k = _overlapping(lo3_sorted, order3, max_width3, range_lo, range_hi, slack)
+        i = a[query]
+
+        # the parallelogram (i, k), projected on the normal of the second family
+        det = n1[0]*n3[1] - n1[1]*n3[0]
+        corners = np.stack([np.stack([(c1*n3[1] - c3*n1[1]) / det, (n1[0]*c3 - n3[0]*c1) / det], axis=-1)
+                            for c1, c3 in ((lo1[i], lo3[k]), (hi1[i], lo3[k]), (hi1[i], hi3[k]), (lo1[i], hi3[k]))],
+                           axis=1)
+        cell_proj = corners @ n2
+        cell, j = _overlapping(lo2_sorted, order2, max_width2, cell_proj.min(axis=1), cell_proj.max(axis=1), slack)
+        i, k = i[cell], k[cell]
+        cell_lo, cell_hi = cell_proj.min(axis=1)[cell], cell_proj.max(axis=1)[cell]
+        overlap = (hi2[j] >= cell_lo - slack) & (lo2[j] <= cell_hi + slack)
+        i, j, k = i[overlap], j[overlap], k[overlap]
+        if len(i) == 0:
+            continue
+
+        centers = centers_of_three_parallel_pairs(pairs[0][i], pairs[1][j], pairs[2][k], tol=tol)
+        keep = ~np.isnan(centers[:, 0])
+        if bounds is not None:
+            xmin, ymin, xmax, ymax = bounds
+            keep &= ((centers[:, 0] > xmin) & (centers[:, 1] > ymin)
+                     & (centers[:, 0] < xmax) & (centers[:, 1] < ymax))
+        found.append((np.stack([i, j, k], axis=1)[keep], centers[keep]))
+
+    if not found:
+        return no_triples
+    triples = np.concatenate([f[0] for f in found])
+    centers = np.concatenate([f[1] for f in found])
+    order = np.lexsort((triples[:, 2], triples[:, 1], triples[:, 0]))
+    return triples[order], centers[order]
 
 if __name__ == "__main__":
 
@@ -282,5 +713,5 @@ if __name__ == "__main__":
     c2 = LineString([(-10, 16), (10, -4)])
 
     center = center_of_three_parallel_pairs(a1, a2, b1, b2, c1, c2)
-    print(center.x, center.y)  # middle of the hexagon (or degenerate polygon)
+    print(center)  # middle of the hexagon (or degenerate polygon)
 
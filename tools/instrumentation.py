@@ -0,0 +1,83 @@
+"""
+Stage timers and counters for the reconstruction pipelines.
+
+The algorithm modules call timer(name) around their stages, count(name)
+at interesting operations and record(name, value) for parameters they
+compute, such as the ray spacing. Nothing is recorded unless a Metrics collection
+is active, and then the calls cost one global lookup and return at once:
+
+    with instrumentation.collect() as metrics:
+        segments = reconstract_building(building)
+    print(metrics.as_dict())
+
+The active collection is per process, so work done on a process pool (see
+MeasurementExecutor) is counted by the caller, not by the workers.
+"""
+import contextlib
+import time
+
+class Metrics():
+    """
+    Wall clock seconds and counters accumulated by name.
+
+    timers: dict of stage name -> seconds spent in it, summed over calls
+    counters: dict of counter name -> total
+    values: dict of value name -> last recorded value
+    """
+    def __init__(self):
+        self.timers = {}
+        self.counters = {}
+        self.values = {}
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] = self.timers.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def record(self, name, value):
+        self.values[name] = value
+
+    def as_dict(self):
+        return {'timers': dict(self.timers), 'counters': dict(self.counters), 'values': dict(self.values)}
+
+# Metrics of the current collect block, None when not collecting
+_active = None
+_NULL_TIMER = contextlib.nullcontext()
+
+def timer(name):
+    """Context manager timing the stage `name`, a no-op when not collecting."""
+    if _active is None:
+        return _NULL_TIMER
+    return _active.timer(name)
+
+def count(name, n=1):
+    """Adds n to the counter `name`, a no-op when not collecting."""
+    if _active is not None:
+        _active.count(name, n)
+
+def record(name, value):
+    """Records value under `name`, a no-op when not collecting."""
+    if _active is not None:
+        _active.record(name, value)
+
+@contextlib.contextmanager
+def collect(metrics=None):
+    """
+    Records the timers and counters of the block into metrics (a new
+    Metrics by default), which is yielded. An inner collect block records
+    into its own Metrics only.
+    """
+    global _active
+    metrics = metrics if metrics is not None else Metrics()
+    previous = _active
+    _active = metrics
+    try:
+        yield metrics
+    finally:
+        _active = previous
@@ -1,5 +1,59 @@
+from fractions import Fraction
+import random
+import numpy as np
 from shapely.geometry import LineString
 from shapely.strtree import STRtree
+from tools import instrumentation
+
+class SegmentIndex():
+    """
+    Walls of a building, converted to LineStrings and bulk loaded into an
+    STRtree once, so measuring many rays only pays for the query and the
+    predicate work.
+
+    segments: iterable of ((x1,y1),(x2,y2))
+    """
+    def __init__(self, segments):
+        self.geoms = [LineString(s) for s in segments]
+        self.tree = STRtree(self.geoms)
+
+    def count_crossings(
+        self, seg,
+        include_endpoints=True,   # count intersections that only touch at endpoints
+        include_colinear=True     # count colinear overlaps as “crossings”
+    ):
+        """
+        seg: ((x1,y1),(x2,y2))
+        returns: int, or -1 if seg overlaps one of the walls colinearly
+        """
+        instrumentation.count('count_crossings_calls')
+        instrumentation.count('rays_measured')
+        target = LineString(seg)
+        # Fast candidate filtering by bbox
+        candidate_indices = self.tree.query(target)
+
+        count = 0
+        for idx in candidate_indices:
+            g = self.geoms[idx]
+            if target.equals(g):
+                continue
+
+            if target.crosses(g):
+                count += 1
+                continue
+
+            if include_endpoints and target.touches(g):
+                count += 1
+                continue
+
+            if include_colinear:
+                inter = target.intersection(g)
+                # Any 1D intersection (positive length) counts as colinear overlap,
+                # including containment or partial overlap.
+                if (inter.geom_type in ("LineString", "MultiLineString")) and inter.length > 0:
+                    return -1
+
+        return count
 
 def count_crossings(
     seg, segments,
@@ -10,36 +64,330 @@ def count_crossings(
     seg: ((x1,y1),(x2,y2))
     segments: iterable of ((x1,y1),(x2,y2))
     returns: int
+
+    Builds a throwaway SegmentIndex; when measuring more than one ray against
+    the same walls build the index once and call its count_crossings instead.
     """
-    target = LineString(seg)
-    geoms  = [LineString(s) for s in segments]
+    return SegmentIndex(segments).count_crossings(seg, include_endpoints, include_colinear)
 
-    # Fast candidate filtering by bbox
-    tree = STRtree(geoms)
-    candidate_indices = tree.query(target)
+# Shewchuk's error bound for the floating point orientation determinant
+_ORIENTATION_ERRBOUND = 3.3306690738754716e-16
 
-    count = 0
-    for idx in candidate_indices:
-        g = geoms[idx]
-        if target.equals(g):
-            continue
+def _orientation(p, q, r):
+    """
+    Sign of the cross product (q - p) x (r - p); arrays broadcast.
 
-        if target.crosses(g):
-            count += 1
-            continue
+    The floating point determinant is only trusted outside Shewchuk's error
+    bound, the few near-degenerate entries are re-evaluated exactly so the
+    result agrees with the robust predicates Shapely uses.
+    """
+    detleft = (q[..., 0] - p[..., 0]) * (r[..., 1] - p[..., 1])
+    detright = (q[..., 1] - p[..., 1]) * (r[..., 0] - p[..., 0])
+    det = detleft - detright
+    sign = np.sign(det)
+    uncertain = np.abs(det) <= _ORIENTATION_ERRBOUND * (np.abs(detleft) + np.abs(detright))
+    if uncertain.any():
+        p, q, r = np.broadcast_arrays(p, q, r)
+        for idx in zip(*np.nonzero(uncertain)):
+            sign[idx] = _exact_orientation_sign(p[idx], q[idx], r[idx])
+    return sign
 
-        if include_endpoints and target.touches(g):
-            count += 1
-            continue
+def _exact_orientation_sign(p, q, r):
+    (px, py), (qx, qy), (rx, ry) = [(Fraction(float(v[0])), Fraction(float(v[1]))) for v in (p, q, r)]
+    exact = (qx - px) * (ry - py) - (qy - py) * (rx - px)
+    return (exact > 0) - (exact < 0)
 
+def orientation_sign(p, q, r):
+    """
+    Sign of (q - p) x (r - p) for single points, exact near zero like
+    Shapely's predicates; the scalar version of the orientation test of
+    count_crossings_batch.
+    """
+    detleft = (q[0] - p[0]) * (r[1] - p[1])
+    detright = (q[1] - p[1]) * (r[0] - p[0])
+    det = detleft - detright
+    if abs(det) > _ORIENTATION_ERRBOUND * (abs(detleft) + abs(detright)):
+        return (det > 0) - (det < 0)
+    if detleft == 0 and detright == 0:
+        # a zero difference is exact, so is the colinearity of axis-aligned walls
+        return 0
+    return _exact_orientation_sign(p, q, r)
+
+def _in_box(p, q, r):
+    """True where r lies inside the bounding box of segment p-q."""
+    return ((np.minimum(p[..., 0], q[..., 0]) <= r[..., 0]) & (r[..., 0] <= np.maximum(p[..., 0], q[..., 0]))
+            & (np.minimum(p[..., 1], q[..., 1]) <= r[..., 1]) & (r[..., 1] <= np.maximum(p[..., 1], q[..., 1])))
+
+def count_crossings_batch(
+    rays, segments,
+    include_endpoints=True,   # count intersections that only touch at endpoints
+    include_colinear=True,    # count colinear overlaps as “crossings”
+    chunk_size=None
+):
+    """
+    Vectorized count_crossings for many rays at once.
+
+    rays: array-like of shape (R, 2, 2), ((x1,y1),(x2,y2)) per ray
+    segments: array-like of shape (W, 2, 2)
+    returns: int array of shape (R,), -1 for rays that overlap a wall colinearly
+
+    Every ray is tested against every wall with one broadcasted orientation
+    test, using the same rules as SegmentIndex.count_crossings: a wall equal
+    to the ray is skipped, proper crossings and endpoint touches count one,
+    and a colinear overlap of positive length turns the ray into -1. Rays are
+    processed `chunk_size` at a time to bound the R x W temporaries.
+    """
+    rays = np.asarray(rays, dtype=float).reshape(-1, 2, 2)
+    walls = np.asarray(segments, dtype=float).reshape(-1, 2, 2)
+    instrumentation.count('count_crossings_calls')
+    instrumentation.count('rays_measured', len(rays))
+    counts = np.zeros(len(rays), dtype=int)
+    if len(rays) == 0 or len(walls) == 0:
+        return counts
+    if chunk_size is None:
+        chunk_size = max(1, 2**20 // len(walls))
+
+    c = walls[None, :, 0]
+    d = walls[None, :, 1]
+    for start in range(0, len(rays), chunk_size):
+        a = rays[start:start + chunk_size, None, 0]
+        b = rays[start:start + chunk_size, None, 1]
+        o1 = _orientation(c, d, a)
+        o2 = _orientation(c, d, b)
+        o3 = _orientation(a, b, c)
+        o4 = _orientation(a, b, d)
+
+        equal = ((a == c).all(-1) & (b == d).all(-1)) | ((a == d).all(-1) & (b == c).all(-1))
+        colinear = (o1 == 0) & (o2 == 0) & (o3 == 0) & (o4 == 0) & ~equal
+        crosses = (o1 * o2 < 0) & (o3 * o4 < 0)
+        touches = ((o1 == 0) & _in_box(c, d, a)) | ((o2 == 0) & _in_box(c, d, b)) \
+            | ((o3 == 0) & _in_box(a, b, c)) | ((o4 == 0) & _in_box(a, b, d))
+
+        # Colinear pairs: overlap length along the ray decides between a
+        # single touching point and a 1D overlap.
+        direction = b - a
+        length2 = (direction ** 2).sum(-1)
+        safe_length2 = np.where(length2 == 0, 1, length2)
+        tc = ((c - a) * direction).sum(-1) / safe_length2
+        td = ((d - a) * direction).sum(-1) / safe_length2
+        overlap = np.minimum(1, np.maximum(tc, td)) - np.maximum(0, np.minimum(tc, td))
+        overlaps = colinear & (overlap > 0)
+
+        hits = crosses & ~equal
+        if include_endpoints:
+            hits |= touches & ~crosses & ~equal & ~overlaps
+        chunk_counts = hits.sum(axis=1)
         if include_colinear:
-            inter = target.intersection(g)
-            # Any 1D intersection (positive length) counts as colinear overlap,
-            # including containment or partial overlap.
-            if (inter.geom_type in ("LineString", "MultiLineString")) and inter.length > 0:
-                return -1
+            chunk_counts[overlaps.any(axis=1)] = -1
+        counts[start:start + chunk_size] = chunk_counts
+    return counts
+
+def count_crossings_sweep(rays, segments):
+    """
+    count_crossings for a family of parallel rays, such as the output of
+    create_rays, in O((W + R) log W).
+
+    rays: array-like of shape (R, 2, 2), all parallel to the first ray
+    segments: array-like of shape (W, 2, 2)
+    returns: int array of shape (R,), -1 for rays that overlap a wall colinearly
 
-    return count
+    Every wall is projected onto the axis perpendicular to the rays, so a ray
+    at offset t meets the walls whose interval [lo, hi] contains t. Sorting
+    the interval ends once turns each count into two binary searches. The
+    rays are assumed to be long enough to span every wall along their
+    direction, which holds for rays crossing the whole building. Rays that
+    pass exactly through a wall endpoint may differ from
+    count_crossings_batch by floating point rounding of the projection.
+    """
+    rays = np.asarray(rays, dtype=float).reshape(-1, 2, 2)
+    walls = np.asarray(segments, dtype=float).reshape(-1, 2, 2)
+    instrumentation.count('count_crossings_calls')
+    instrumentation.count('rays_measured', len(rays))
+    if len(rays) == 0 or len(walls) == 0:
+        return np.zeros(len(rays), dtype=int)
+
+    direction = rays[0, 1] - rays[0, 0]
+    normal = np.array([-direction[1], direction[0]])
+    ray_offsets = rays[:, 0] @ normal
+    wall_offsets = walls @ normal
+    lo = np.sort(wall_offsets.min(axis=1))
+    hi = np.sort(wall_offsets.max(axis=1))
+    counts = np.searchsorted(lo, ray_offsets, side="right") - np.searchsorted(hi, ray_offsets, side="left")
+
+    # Walls parallel to the rays project to a single offset; a ray sitting
+    # exactly on one of them overlaps it colinearly.
+    parallel = wall_offsets[:, 0] == wall_offsets[:, 1]
+    parallel &= (walls[:, 0] != walls[:, 1]).any(axis=1)
+    if parallel.any():
+        colinear_offsets = np.sort(wall_offsets[parallel, 0])
+        pos = np.searchsorted(colinear_offsets, ray_offsets)
+        on_wall = colinear_offsets[np.minimum(pos, len(colinear_offsets) - 1)] == ray_offsets
+        counts[on_wall] = -1
+    return counts
+
+def find_key_ray_events(rays, segments, check_samples=0, rng=None):
+    """
+    Key rays of a family of parallel, evenly ordered rays (as produced by
+    create_rays) without measuring the whole family.
+
+    The k-visibility of a ray only changes where its offset passes the
+    projection of a wall endpoint, so only the rays on both sides of every
+    such event are measured. The result is the same as scanning the dense
+    measurement vector for consecutive rays with different counts.
+
+    rays: sequence of ((x1,y1),(x2,y2)), parallel and sorted by offset
+    segments: iterable of ((x1,y1),(x2,y2))
+    check_samples: number of random rays to measure and compare with the
+        counts implied by the events
+    rng: random.Random used to pick the samples, defaults to the random module
+    returns: list of (i, mesure[i], mesure[i+1]) for every i where the count
+        changes between rays[i] and rays[i+1]
+
+    Raises:
+        ValueError if a sampled ray disagrees with the event model.
+    """
+    ray_arr = np.asarray(rays, dtype=float).reshape(-1, 2, 2)
+    walls = np.asarray(segments, dtype=float).reshape(-1, 2, 2)
+    if len(ray_arr) < 2 or len(walls) == 0:
+        return []
+
+    direction = ray_arr[0, 1] - ray_arr[0, 0]
+    normal = np.array([-direction[1], direction[0]])
+    ray_offsets = ray_arr[:, 0] @ normal
+    if ray_offsets[-1] < ray_offsets[0]:
+        ray_offsets = -ray_offsets
+        normal = -normal
+    events = np.unique(walls @ normal)
+
+    # The ray at or just before each event and its successor; a ray sitting
+    # exactly on an event can differ from both of its neighbours.
+    before = np.searchsorted(ray_offsets, events, side="right") - 1
+    exact = (before >= 0) & (ray_offsets[np.maximum(before, 0)] == events)
+    starts = np.concatenate([before, before[exact] - 1])
+    starts = np.unique(starts[(starts >= 0) & (starts < len(ray_offsets) - 1)])
+
+    measured = np.unique(np.concatenate([starts, starts + 1]))
+    if len(measured) == 0:
+        measured = np.array([0])
+    counts = dict(zip(measured.tolist(), count_crossings_batch(ray_arr[measured], walls).tolist()))
+
+    if check_samples:
+        rng = rng if rng is not None else random
+        samples = rng.sample(range(len(ray_offsets)), k=min(check_samples, len(ray_offsets)))
+        sample_counts = count_crossings_batch(ray_arr[samples], walls).tolist()
+        for j, mesure in zip(samples, sample_counts):
+            # Rays next to every event are measured, so the nearest measured
+            # ray before j (or after it) sees the same walls.
+            pos = np.searchsorted(measured, j)
+            if pos < len(measured) and measured[pos] == j:
+                nearest = j
+            else:
+                nearest = measured[pos - 1] if pos > 0 else measured[pos]
+            if counts[int(nearest)] != mesure:
+                raise ValueError(f"Ray {j} measured {mesure}, events predict {counts[int(nearest)]}.")
+
+    key_events = []
+    for i in starts.tolist():
+        if counts[i] != counts[i + 1]:
+            key_events.append((i, counts[i], counts[i + 1]))
+    return key_events
+
+def find_key_ray_events_adaptive(rays, segments, coarse_stride=8, check_samples=0, rng=None):
+    """
+    Key rays of a family of parallel rays found coarse to fine: every
+    coarse_stride-th ray is measured first, and every coarse interval whose
+    end rays see a different number of walls is bisected, one batch of
+    midpoints per level, until the change is between two consecutive rays.
+
+    Sparse parts of the building are only measured at the coarse spacing, so
+    far fewer rays are measured than by the dense scan. A coarse interval
+    whose end rays agree is not refined, so changes that cancel out inside
+    it (a ray entering and leaving a wall within coarse_stride rays) are
+    missed; coarse_stride=1 is the dense scan.
+
+    rays: sequence of ((x1,y1),(x2,y2)), parallel and sorted by offset
+    segments: iterable of ((x1,y1),(x2,y2))
+    coarse_stride: rays between the coarse measurements
+    check_samples: number of random rays to measure and compare with the
+        counts implied by the events, to detect missed changes
+    rng: random.Random used to pick the samples, defaults to the random module
+    returns: (events, num_of_measured) with events the list of
+        (i, mesure[i], mesure[i+1]) for every change found, like
+        find_key_ray_events, and the number of rays measured (without the
+        samples)
+
+    Raises:
+        ValueError if a sampled ray disagrees with the events found.
+    """
+    if coarse_stride < 1:
+        raise ValueError(f"coarse_stride must be at least 1, got {coarse_stride}")
+    ray_arr = np.asarray(rays, dtype=float).reshape(-1, 2, 2)
+    walls = np.asarray(segments, dtype=float).reshape(-1, 2, 2)
+    if len(ray_arr) < 2:
+        return [], 0
+
+    counts = np.zeros(len(ray_arr), dtype=int)
+    measured = np.zeros(len(ray_arr), dtype=bool)
+    coarse = np.unique(np.append(np.arange(0, len(ray_arr), coarse_stride), len(ray_arr) - 1))
+    counts[coarse] = count_crossings_sweep(ray_arr[coarse], walls)
+    measured[coarse] = True
+    num_of_measured = len(coarse)
+
+    lo, hi = coarse[:-1], coarse[1:]
+    changed = counts[lo] != counts[hi]
+    lo, hi = lo[changed], hi[changed]
+    events = []
+    while len(lo):
+        resolved = hi - lo == 1
+        events.extend(zip(lo[resolved].tolist(), counts[lo[resolved]].tolist(), counts[hi[resolved]].tolist()))
+        lo, hi = lo[~resolved], hi[~resolved]
+        if not len(lo):
+            break
+        mid = (lo + hi) // 2
+        counts[mid] = count_crossings_sweep(ray_arr[mid], walls)
+        measured[mid] = True
+        num_of_measured += len(mid)
+        # keep the halves that still see a change
+        left = counts[lo] != counts[mid]
+        right = counts[mid] != counts[hi]
+        lo, hi = np.concatenate([lo[left], mid[right]]), np.concatenate([mid[left], hi[right]])
+    events.sort()
+
+    if check_samples:
+        rng = rng if rng is not None else random
+        samples = rng.sample(range(len(ray_arr)), k=min(check_samples, len(ray_arr)))
+        sample_counts = count_crossings_sweep(ray_arr[samples], walls).tolist()
+        measured_idx = np.nonzero(measured)[0]
+        for j, mesure in zip(samples, sample_counts):
+            # the count is assumed constant from the last measured ray up to j
+            nearest = int(measured_idx[np.searchsorted(measured_idx, j, side='right') - 1])
+            if counts[nearest] != mesure:
+                raise ValueError(f"Ray {j} measured {mesure}, events predict {counts[nearest]}.")
+    return events, num_of_measured
+
+def find_key_rays_from_events(rays, segments, check_samples=0):
+    """
+    find_key_ray_events in the key rays format of the reconstraction
+    algorithms: a list of {'rays': (ray i, ray i+1), 'mesure': (m_i, m_i+1),
+    'index': i}.
+    """
+    # only the rays next to projected wall endpoints are measured
+    key_couples = []
+    for i, mesure1, mesure2 in find_key_ray_events(rays, segments, check_samples):
+        key_couples.append({'rays': (rays[i], rays[i+1]), 'mesure': (mesure1, mesure2), 'index': i})
+    return key_couples
+
+def find_key_rays_adaptive(rays, segments, coarse_stride=8, check_samples=0):
+    """
+    find_key_ray_events_adaptive in the key rays format of the reconstraction
+    algorithms, see find_key_rays_from_events.
+    """
+    # measure every coarse_stride-th ray and bisect only where the count changes
+    key_couples = []
+    events, _ = find_key_ray_events_adaptive(rays, segments, coarse_stride, check_samples)
+    for i, mesure1, mesure2 in events:
+        key_couples.append({'rays': (rays[i], rays[i+1]), 'mesure': (mesure1, mesure2), 'index': i})
+    return key_couples
 
 if __name__ == "__main__":
     # myseg = ((0,0), (0,10))
@@ -0,0 +1,138 @@
+import bisect
+import numpy as np
+
+def _wall_tuple(seg):
+    (x1, y1), (x2, y2) = np.asarray(seg, dtype=float).reshape(2, 2).tolist()
+    return ((x1, y1), (x2, y2))
+
+class MeasurementCache():
+    """
+    k-visibility measurements and key rays of parallel ray families (one
+    create_rays output per angle), kept up to date while walls are added,
+    removed or moved.
+
+    The counts are those of count_crossings_sweep: a ray at offset t along
+    the family's normal meets every wall whose projection [lo, hi] contains
+    t, and is marked -1 if it lies on a wall parallel to it. Each wall adds
+    to its range of rays independently, so a wall edit only touches the rays
+    whose offsets fall inside the wall's projection, found by binary search,
+    and only the key rays next to them are re-derived.
+
+    ray_families: list of ray lists, each parallel and ordered by offset
+    segments: iterable of ((x1,y1),(x2,y2)), the current walls
+    """
+    def __init__(self, ray_families, segments):
+        self.ray_families = [list(rays) for rays in ray_families]
+        self.walls = [_wall_tuple(seg) for seg in segments]
+        self._normals = []
+        self._offsets = []
+        self._crossings = []
+        self._colinear = []
+        self.mesurements = []
+        self.key_rays = []
+        self._key_indices = []
+        for rays in self.ray_families:
+            ray_arr = np.asarray(rays, dtype=float).reshape(-1, 2, 2)
+            direction = ray_arr[0, 1] - ray_arr[0, 0]
+            normal = np.array([-direction[1], direction[0]])
+            offsets = ray_arr[:, 0] @ normal
+            if offsets[-1] < offsets[0]:
+                normal, offsets = -normal, -offsets
+            if np.any(np.diff(offsets) < 0):
+                raise ValueError("The rays of a family must be ordered by offset")
+            self._normals.append(normal)
+            self._offsets.append(offsets)
+            self._crossings.append(np.zeros(len(rays), dtype=int))
+            self._colinear.append(np.zeros(len(rays), dtype=int))
+            self.mesurements.append(np.zeros(len(rays), dtype=int))
+            self.key_rays.append([])
+            self._key_indices.append([])
+        for wall in self.walls:
+            self._apply(wall, 1)
+        for family in range(len(self.ray_families)):
+            self._update_key_rays(family, 0, len(self.ray_families[family]))
+
+    def _apply(self, wall, sign):
+        """
+        Adds (sign=1) or removes (sign=-1) the counts of a wall.
+        returns: list of the (start, stop) ray range touched in each family
+        """
+        wall_arr = np.asarray(wall, dtype=float)
+        ranges = []
+        for family, normal in enumerate(self._normals):
+            wall_offsets = wall_arr @ normal
+            lo, hi = wall_offsets.min(), wall_offsets.max()
+            offsets = self._offsets[family]
+            start = int(np.searchsorted(offsets, lo, side='left'))
+            stop = int(np.searchsorted(offsets, hi, side='right'))
+            self._crossings[family][start:stop] += sign
+            # a wall parallel to the rays marks the rays lying on it
+            if wall_offsets[0] == wall_offsets[1] and wall[0] != wall[1]:
+                self._colinear[family][start:stop] += sign
+            self.mesurements[family][start:stop] = np.where(
+                self._colinear[family][start:stop] > 0, -1, self._crossings[family][start:stop])
+            ranges.append((start, stop))
+        return ranges
+
+    def _update_key_rays(self, family, start, stop):
+        """Re-derives the key rays that involve the rays in [start, stop)."""
+        rays = self.ray_families[family]
+        mesure = self.mesurements[family]
+        first = max(start - 1, 0)
+        last = min(stop, len(rays) - 1)
+        if first >= last:
+            return
+        changed = np.nonzero(mesure[first:last] != mesure[first + 1:last + 1])[0] + first
+        key_indices = self._key_indices[family]
+        lo = bisect.bisect_left(key_indices, first)
+        hi = bisect.bisect_left(key_indices, last)
+        key_indices[lo:hi] = changed.tolist()
+        self.key_rays[family][lo:hi] = [
+            {'rays': (rays[i], rays[i+1]), 'mesure': (int(mesure[i]), int(mesure[i+1])), 'index': i}
+            for i in changed.tolist()]
+
+    def _edit(self, wall, sign):
+        ranges = self._apply(wall, sign)
+        for family, (start, stop) in enumerate(ranges):
+            self._update_key_rays(family, start, stop)
+        return ranges
+
+    def add_wall(self, seg):
+        """
+        Adds a wall.
+        returns: list of the (start, stop) range of rays updated in each family
+        """
+        wall = _wall_tuple(seg)
+        self.walls.append(wall)
+        return self._edit(wall, 1)
+
+    def remove_wall(self, seg):
+        """
+        Removes a wall equal to seg.
+        returns: list of the (start, stop) range of rays updated in each family
+        raises ValueError if there is no such wall
+        """
+        wall = _wall_tuple(seg)
+        try:
+            self.walls.remove(wall)
+        except ValueError:
+            raise ValueError(f"No wall {wall} in the cache") from None
+        return self._edit(wall, -1)
+
+    def move_wall(self, old_seg, new_seg):
+        """
+        Replaces the wall old_seg by new_seg.
+        returns: list of the updated ray ranges of the removal and the addition
+        """
+        return self.remove_wall(old_seg) + self.add_wall(new_seg)
+
+if __name__ == '__main__':
+    import random
+
+    frame = [((0, 0), (8, 0)), ((8, 0), (8, 10)), ((8, 10), (0, 10)), ((0, 10), (0, 0))]
+    vertical_rays = [((x, 0), (x, 10)) for x in np.arange(-0.005, 8.01, 0.01)]
+    diagonal_rays = [((x - 5, 0), (x + 5, 10)) for x in np.arange(-0.005, 13.01, 0.01)]
+    cache = MeasurementCache([vertical_rays, diagonal_rays], frame)
+    for _ in range(20):
+        wall = ((random.uniform(0, 8), random.uniform(0, 10)), (random.uniform(0, 8), random.uniform(0, 10)))
+        print(cache.add_wall(wall))
@@ -0,0 +1,135 @@
+import os
+from multiprocessing import Pool
+import numpy as np
+from tools import instrumentation
+from tools.k_visibility import count_crossings_batch, count_crossings_sweep
+
+# Walls of the building being measured, set once per worker process
+_walls = None
+
+def _init_worker(walls):
+    global _walls
+    _walls = walls
+
+def _measure_chunk(rays, method):
+    return _measure(rays, _walls, method)
+
+def _measure(rays, walls, method):
+    if method == 'sweep':
+        return count_crossings_sweep(rays, walls)
+    elif method == 'batch':
+        return count_crossings_batch(rays, walls)
+    raise ValueError(f"Unknown measurement method: {method}")
+
+# Measured costs, in seconds, the automatic mode weighs to decide whether a
+# pool pays off (numpy 2, one x86 core, forked workers): starting a pool,
+# pickling a ray to a worker and its count back, sweeping a ray and testing
+# one ray-wall pair in a batch. Shipping a ray costs more than sweeping it,
+# so sweeps always stay in the calling process, while a batch measurement
+# of a few thousand rays against tens of walls already runs faster on two
+# or more workers.
+POOL_STARTUP_SECONDS = 0.05
+SHIP_SECONDS_PER_RAY = 2.3e-7
+SWEEP_SECONDS_PER_RAY = 3.5e-8
+BATCH_SECONDS_PER_PAIR = 5e-7
+
+class MeasurementExecutor():
+    """
+    Measures the k-visibility of many ray families against one set of walls,
+    in the calling process or on a process pool.
+
+    On a pool, the walls are shipped to every worker once, when the pool
+    starts, and the rays of all families are split into chunks of equal
+    size, so all workers stay busy regardless of the number of angles.
+
+    segments: iterable of ((x1,y1),(x2,y2))
+    processes: number of worker processes, 1 measures in the calling
+        process; None (the default) uses os.cpu_count() workers when the
+        measured costs above estimate the pool to be faster than the calling
+        process, see estimate_seconds
+    chunks_per_process: chunks handed to each worker, more chunks balance
+        uneven workers better at the cost of more pickling
+
+    Use it as a context manager to keep a pool alive between measure calls,
+    otherwise every call that needs a pool starts and stops its own.
+    """
+    def __init__(self, segments, processes=None, chunks_per_process=4):
+        self.walls = np.asarray(segments, dtype=float).reshape(-1, 2, 2)
+        self.processes = processes
+        self.chunks_per_process = chunks_per_process
+        self._pool = None
+        self._keep_pool = False
+
+    def __enter__(self):
+        # the pool itself is started by the first measure call that needs it
+        self._keep_pool = True
+        return self
+
+    def __exit__(self, *exc_info):
+        self._keep_pool = False
+        self._close_pool()
+
+    def _close_pool(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def estimate_seconds(self, method, num_of_rays, processes):
+        """Estimated wall clock seconds of measuring num_of_rays rays on processes workers."""
+        if method == 'sweep':
+            work = num_of_rays * SWEEP_SECONDS_PER_RAY
+        else:
+            work = num_of_rays * len(self.walls) * BATCH_SECONDS_PER_PAIR
+        if processes == 1:
+            return work
+        startup = POOL_STARTUP_SECONDS if self._pool is None else 0
+        return startup + num_of_rays * SHIP_SECONDS_PER_RAY + work / processes
+
+    def _num_of_processes(self, method, num_of_rays):
+        if self.processes is not None:
+            return self.processes
+        cpus = os.cpu_count() or 1
+        if cpus > 1 and self.estimate_seconds(method, num_of_rays, cpus) < self.estimate_seconds(method, num_of_rays, 1):
+            return cpus
+        return 1
+
+    def measure(self, ray_families, method='batch'):
+        """
+        ray_families: list of ray lists, e.g. one create_rays output per angle
+        method: 'batch' for any rays, 'sweep' when every family is parallel
+        returns: list with the measurements of each family, as lists of int
+        """
+        families = [np.asarray(rays, dtype=float).reshape(-1, 2, 2) for rays in ray_families]
+        total = sum(len(rays) for rays in families)
+        instrumentation.count('measured_families', len(families))
+        processes = self._num_of_processes(method, total)
+        if processes == 1:
+            return [_measure(rays, self.walls, method).tolist() for rays in families]
+
+        # chunks never span two families, so a sweep still sees parallel rays
+        chunk_size = max(1, -(-total // (processes * self.chunks_per_process)))
+        tasks = []
+        owners = []
+        for idx, rays in enumerate(families):
+            for start in range(0, len(rays), chunk_size):
+                tasks.append((rays[start:start + chunk_size], method))
+                owners.append(idx)
+
+        # the workers do not report to the caller's instrumentation; a family
+        # counts as one call like in the calling process, whatever its chunks
+        instrumentation.count('count_crossings_calls', len(families))
+        instrumentation.count('rays_measured', total)
+        instrumentation.count('pool_tasks', len(tasks))
+        if self._pool is None:
+            self._pool = Pool(processes=processes, initializer=_init_worker, initargs=(self.walls,))
+        try:
+            results = self._pool.starmap(_measure_chunk, tasks)
+        finally:
+            if not self._keep_pool:
+                self._close_pool()
+
+        mesurements = [[] for _ in families]
+        for idx, counts in zip(owners, results):
+            mesurements[idx].extend(counts.tolist())
+        return mesurements
@@ -0,0 +1,168 @@
+"""
+Binary k-visibility measurement files.
+
+A file holds the measurements of several families of parallel rays as laid
+out by create_rays: ray i of a family goes from (x1, 0) to (x1 + ray_shift,
+height) with x1 = i*spacing - origin_shift - spacing/2. All numbers are
+little-endian:
+
+    header, 32 bytes
+        magic         4s   b'KVIS'
+        version       u2   1
+        reserved      u2   0
+        num_angles    u4
+        reserved      u4   0
+        width         f8   building width
+        height        f8   building height
+    angle table, 48 bytes per angle
+        angle         f8   ray angle in radians
+        spacing       f8   dist_between_rays
+        origin_shift  f8
+        ray_shift     f8
+        count         u8   number of rays
+        data_offset   u8   byte offset of the counts from the file start
+    counts
+        count x i2 per angle, the k-visibility of every ray, -1 for a ray
+        lying on a wall
+
+read_measurements memory-maps the counts, so opening a file of millions of
+rays reads only the header and the table.
+"""
+import math
+import numpy as np
+
+MAGIC = b'KVIS'
+VERSION = 1
+HEADER_DTYPE = np.dtype([('magic', 'S4'), ('version', '<u2'), ('reserved', '<u2'),
+                         ('num_angles', '<u4'), ('reserved2', '<u4'), ('width', '<f8'), ('height', '<f8')])
+TABLE_DTYPE = np.dtype([('angle', '<f8'), ('spacing', '<f8'), ('origin_shift', '<f8'),
+                        ('ray_shift', '<f8'), ('count', '<u8'), ('data_offset', '<u8')])
+
+class RecordRays():
+    """
+    The rays of a recorded family, computed on access. Indexing gives the
+    same [(x1,0), (x2,height)] lists as create_rays, np.asarray gives all of
+    them as an (N,2,2) array.
+    """
+    def __init__(self, count, spacing, origin_shift, ray_shift, height):
+        self.count = count
+        self.spacing = spacing
+        self.origin_shift = origin_shift
+        self.ray_shift = ray_shift
+        self.height = height
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(self.count))]
+        if idx < 0:
+            idx += self.count
+        if not 0 <= idx < self.count:
+            raise IndexError("RecordRays index out of range")
+        x1 = idx*self.spacing - self.origin_shift - self.spacing/2
+        return [(x1, 0), (x1 + self.ray_shift, self.height)]
+
+    def __iter__(self):
+        for idx in range(self.count):
+            yield self[idx]
+
+    def __array__(self, dtype=None, copy=None):
+        x1 = np.arange(self.count)*self.spacing - self.origin_shift - self.spacing/2
+        rays = np.zeros((self.count, 2, 2), dtype=np.float64)
+        rays[:, 0, 0] = x1
+        rays[:, 1, 0] = x1 + self.ray_shift
+        rays[:, 1, 1] = self.height
+        return rays if dtype is None else rays.astype(dtype)
+
+class MeasurementRecord():
+    """
+    The measurements of one ray family.
+
+    angle, spacing, origin_shift, ray_shift: the family layout, see the
+        module docstring
+    width, height: the building size
+    mesurements: array-like of int, one count per ray
+    """
+    def __init__(self, angle, spacing, origin_shift, ray_shift, width, height, mesurements):
+        self.angle = angle
+        self.spacing = spacing
+        self.origin_shift = origin_shift
+        self.ray_shift = ray_shift
+        self.width = width
+        self.height = height
+        self.mesurements = mesurements
+        self.rays = RecordRays(len(mesurements), spacing, origin_shift, ray_shift, height)
+
+def record_for_angle(width, height, angle, dist_between_rays, mesurements):
+    """
+    MeasurementRecord of a family made by create_rays(width, height,
+    dist_between_rays, angle).
+    """
+    angle_dist = 0 if angle == 0 else height / math.tan(angle)
+    origin_shift = angle_dist if angle < math.pi/2 else 0
+    return MeasurementRecord(angle, dist_between_rays, origin_shift, angle_dist, width, height, mesurements)
+
+def write_measurements(path, records):
+    """
+    Writes MeasurementRecords of one building (all with the same size) to path.
+    raises ValueError if the sizes differ or a count does not fit in int16
+    """
+    sizes = {(record.width, record.height) for record in records}
+    if len(sizes) > 1:
+        raise ValueError(f"All records must have the same building size, got {sorted(sizes)}")
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header['magic'] = MAGIC
+    header['version'] = VERSION
+    header['num_angles'] = len(records)
+    header['width'], header['height'] = sizes.pop() if sizes else (0, 0)
+
+    table = np.zeros(len(records), dtype=TABLE_DTYPE)
+    counts = []
+    data_offset = HEADER_DTYPE.itemsize + TABLE_DTYPE.itemsize * len(records)
+    for entry, record in zip(table, records):
+        mesure = np.asarray(record.mesurements)
+        if len(mesure) and (mesure.min() < np.iinfo(np.int16).min or mesure.max() > np.iinfo(np.int16).max):
+            raise ValueError(f"Counts of angle {record.angle} do not fit in int16")
+        counts.append(mesure.astype('<i2'))
+        entry['angle'] = record.angle
+        entry['spacing'] = record.spacing
+        entry['origin_shift'] = record.origin_shift
+        entry['ray_shift'] = record.ray_shift
+        entry['count'] = len(mesure)
+        entry['data_offset'] = data_offset
+        data_offset += counts[-1].nbytes
+
+    with open(path, 'wb') as f:
+        f.write(header.tobytes())
+        f.write(table.tobytes())
+        for mesure in counts:
+            f.write(mesure.tobytes())
+
+def read_measurements(path):
+    """
+    Reads a measurement file, memory-mapping the counts.
+    returns: list of MeasurementRecord, the mesurements being read-only int16 arrays
+    raises ValueError if path is not a measurement file of a known version
+    """
+    header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+    if len(header) == 0 or header['magic'][0] != MAGIC:
+        raise ValueError(f"{path} is not a measurement file")
+    if header['version'][0] != VERSION:
+        raise ValueError(f"Unsupported measurement file version {header['version'][0]}")
+    num_angles = int(header['num_angles'][0])
+    width = float(header['width'][0])
+    height = float(header['height'][0])
+    table = np.fromfile(path, dtype=TABLE_DTYPE, count=num_angles, offset=HEADER_DTYPE.itemsize)
+
+    records = []
+    for entry in table:
+        count = int(entry['count'])
+        if count:
+            mesure = np.memmap(path, dtype='<i2', mode='r', offset=int(entry['data_offset']), shape=(count,))
+        else:
+            mesure = np.zeros(0, dtype='<i2')
+        records.append(MeasurementRecord(float(entry['angle']), float(entry['spacing']), float(entry['origin_shift']),
+                                         float(entry['ray_shift']), width, height, mesure))
+    return records
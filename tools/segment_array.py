@@ -0,0 +1,98 @@
+import numpy as np
+
+class SegmentArray():
+    """
+    Walls of a building in one contiguous float64 array of shape (N,2,2),
+    with a flags byte per wall.
+
+    Appending grows the storage geometrically, so adding N walls costs O(N)
+    copies in total. Indexing and iterating give ((x1,y1),(x2,y2)) tuples,
+    like the lists the builders used to keep, and np.asarray(segment_array)
+    returns the (N,2,2) coordinates without copying, so the k-visibility
+    kernels take it as is.
+
+    segments: iterable of ((x1,y1),(x2,y2)) to start with
+    flags: flags of the initial segments, an int or one int per segment
+    """
+    HORIZONTAL = 1
+    VERTICAL = 2
+    FRAME = 4
+
+    def __init__(self, segments=None, flags=0, capacity=16):
+        coords = np.asarray(segments if segments is not None else [], dtype=np.float64).reshape(-1, 2, 2)
+        self._size = len(coords)
+        self._coords = np.empty((max(capacity, self._size), 2, 2), dtype=np.float64)
+        self._flags = np.zeros(len(self._coords), dtype=np.uint8)
+        self._coords[:self._size] = coords
+        self._flags[:self._size] = flags
+
+    def _reserve(self, size):
+        if size <= len(self._coords):
+            return
+        capacity = max(size, 2 * len(self._coords))
+        coords = np.empty((capacity, 2, 2), dtype=np.float64)
+        coords[:self._size] = self._coords[:self._size]
+        flags = np.zeros(capacity, dtype=np.uint8)
+        flags[:self._size] = self._flags[:self._size]
+        self._coords, self._flags = coords, flags
+
+    def append(self, segment, flags=0):
+        self._reserve(self._size + 1)
+        self._coords[self._size] = segment
+        self._flags[self._size] = flags
+        self._size += 1
+
+    def extend(self, segments, flags=0):
+        coords = np.asarray(segments, dtype=np.float64).reshape(-1, 2, 2)
+        self._reserve(self._size + len(coords))
+        self._coords[self._size:self._size + len(coords)] = coords
+        self._flags[self._size:self._size + len(coords)] = flags
+        self._size += len(coords)
+
+    @property
+    def coords(self):
+        """(N,2,2) view of the coordinates."""
+        return self._coords[:self._size]
+
+    @property
+    def flags(self):
+        """(N,) view of the flags."""
+        return self._flags[:self._size]
+
+    def where(self, flag):
+        """Indices of the segments that have the flag."""
+        return np.nonzero(self.flags & flag)[0]
+
+    def select(self, flag):
+        """The segments that have the flag, as a list of tuples."""
+        return [self[idx] for idx in self.where(flag).tolist()]
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(self._size))]
+        if idx < 0:
+            idx += self._size
+        if not 0 <= idx < self._size:
+            raise IndexError("SegmentArray index out of range")
+        (x1, y1), (x2, y2) = self._coords[idx].tolist()
+        return ((x1, y1), (x2, y2))
+
+    def __iter__(self):
+        for (x1, y1), (x2, y2) in self.coords.tolist():
+            yield ((x1, y1), (x2, y2))
+
+    def __array__(self, dtype=None, copy=None):
+        # NumPy 2 protocol: copy=True always copies, copy=False never does
+        # (and raises if the dtype needs one), copy=None copies only if needed
+        coords = self.coords
+        if dtype is not None and np.dtype(dtype) != coords.dtype:
+            if copy is False:
+                raise ValueError(f"Converting SegmentArray coordinates to {np.dtype(dtype)} needs a copy")
+            return coords.astype(dtype)
+        return coords.copy() if copy else coords
+
+    def __repr__(self):
+        return f"SegmentArray({list(self)})"
@@ -0,0 +1,89 @@
+import numpy as np
+
+class KeyRayStream():
+    """
+    find_key_rays over the measurements of one angle arriving in chunks.
+
+    Only the key rays found so far and the last ray of the previous chunk
+    are kept, so the raw measurements can be dropped as soon as a chunk is
+    fed.
+    """
+    def __init__(self):
+        self.key_rays = []
+        self._last_ray = None
+        self._last_mesure = None
+        # number of rays fed so far, the index of the first ray of the next chunk
+        self._num_of_rays = 0
+
+    def feed(self, rays, mesure):
+        """
+        rays: the next rays of the angle, in order
+        mesure: their k-visibility
+        returns: the key rays found in this chunk, in find_key_rays format
+        """
+        mesure = np.asarray(mesure)
+        if len(mesure) == 0:
+            return []
+        found = []
+        if self._last_mesure is not None and self._last_mesure != mesure[0]:
+            found.append({'rays': (self._last_ray, rays[0]), 'mesure': (self._last_mesure, int(mesure[0])),
+                          'index': self._num_of_rays - 1})
+        for i in np.nonzero(mesure[:-1] != mesure[1:])[0].tolist():
+            found.append({'rays': (rays[i], rays[i+1]), 'mesure': (int(mesure[i]), int(mesure[i+1])),
+                          'index': self._num_of_rays + i})
+        self._last_ray = rays[len(mesure) - 1]
+        self._last_mesure = int(mesure[-1])
+        self._num_of_rays += len(mesure)
+        self.key_rays.extend(found)
+        return found
+
+def chunk_mesurements(all_rays, mesurements, chunk_size):
+    """
+    Splits measured ray families into the chunks stream_triple_intersections
+    consumes, one angle after the other, e.g. to replay a recorded survey.
+    yields: (angle index, rays, mesurements, is last chunk of the angle)
+    """
+    for angle, (rays, mesure) in enumerate(zip(all_rays, mesurements)):
+        for start in range(0, max(len(rays), 1), chunk_size):
+            yield angle, rays[start:start + chunk_size], mesure[start:start + chunk_size], start + chunk_size >= len(rays)
+
+def stream_triple_intersections(chunks, triples, find_intersections):
+    """
+    Runs the key ray and triple intersection stages on measurements as they
+    arrive.
+
+    chunks: iterable of (angle index, rays, mesurements, is_last); the chunks
+        of an angle come in ray order, chunks of different angles may
+        interleave
+    triples: the angle index triples to intersect
+    find_intersections: function of the three key ray lists of a triple,
+        e.g. find_triple_intersections with the building size bound
+    yields: (triple, intersections) for every triple as soon as the last
+        chunk of its three angles has arrived
+
+    The key rays of an angle are kept only until every triple using it has
+    been intersected.
+
+    Raises:
+        ValueError if the chunks end before every angle of the triples is complete.
+    """
+    streams = {}
+    key_rays = {}
+    pending = [tuple(triple) for triple in triples]
+    for angle, rays, mesure, is_last in chunks:
+        stream = streams.setdefault(angle, KeyRayStream())
+        stream.feed(rays, mesure)
+        if not is_last:
+            continue
+        key_rays[angle] = streams.pop(angle).key_rays
+        ready = [triple for triple in pending if all(a in key_rays for a in triple)]
+        for triple in ready:
+            pending.remove(triple)
+            yield triple, find_intersections(*[key_rays[a] for a in triple])
+        # drop the key rays no pending triple needs
+        needed = {a for triple in pending for a in triple}
+        for a in list(key_rays):
+            if a not in needed:
+                del key_rays[a]
+    if pending:
+        raise ValueError(f"Measurement stream ended before the triples {pending} were complete")